@@ -0,0 +1,19 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# the api is served from a fixed pool of threads per worker, each keeps its database connection between requests.
+# /api/auth/verify has its own deployment of mentoring.asgi:application, see auth-verify in docker-compose.yml
+wsgi_app = os.environ.get("GUNICORN_APP", "mentoring.wsgi:application")
+is_asgi = "asgi" in wsgi_app.split(":")[0]
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker" if is_asgi else "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# settings and signing keys are loaded once in the master and shared with the forked workers
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
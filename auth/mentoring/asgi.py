@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mentoring.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the app registry is ready
+from user.verification import VERIFY_PATH, verify_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # token verification skips the synchronous django and DRF stack
+    if scope["type"] == "http" and scope["path"].rstrip("/") == VERIFY_PATH:
+        return await verify_application(scope, receive, send)
+    return await django_application(scope, receive, send)
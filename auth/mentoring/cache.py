@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+from user.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class LocalTier:
+    def __init__(self, channel: str, max_size: int, ttl: int, reconnect_interval: float):
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.generation = 0
+        self.subscribed = False
+        self.sender = None
+        self.pid = None
+        self.client = None
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def ensure_listener(self, client):
+        # threads are not inherited by forked workers, every process subscribes on its own
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.local.clear()
+                    self.flights = {}
+                    self.subscribed = False
+                    self.sender = uuid.uuid4().hex
+                    self.client = client
+                    threading.Thread(target=self.listen, name="cache-invalidation", daemon=True).start()
+                    self.pid = os.getpid()
+
+    def listen(self):
+        while True:
+            pubsub = self.client.get_client(None).pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # writes missed while unsubscribed may have left stale local entries
+                self.drop()
+                self.subscribed = True
+                for message in pubsub.listen():
+                    self.handle(message)
+            except self.client._lib.RedisError:
+                logger.warning("Cache invalidation channel disconnected, the local tier is bypassed", exc_info=True)
+            finally:
+                self.subscribed = False
+                self.drop()
+                pubsub.close()
+            time.sleep(self.reconnect_interval)
+
+    def handle(self, message):
+        try:
+            data = json.loads(message["data"])
+            keys = data["keys"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring a malformed cache invalidation %r", message["data"])
+            return
+        if data.get("sender") == self.sender:
+            return
+        self.invalidations += 1
+        self.drop(keys)
+
+    def drop(self, keys=None):
+        with self.lock:
+            self.generation += 1
+        if keys is None:
+            self.local.clear()
+        else:
+            for key in keys:
+                self.local.delete(key)
+
+
+# django builds a backend instance per thread and async context, they all share one local tier per process
+local_tiers = {}
+local_tiers_lock = threading.Lock()
+
+
+def get_local_tier(servers, channel: str, **options) -> LocalTier:
+    key = (tuple(servers), channel)
+    with local_tiers_lock:
+        if key not in local_tiers:
+            local_tiers[key] = LocalTier(channel, **options)
+        return local_tiers[key]
+
+
+class TwoTierCache(RedisCache):
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        local_max_size = options.pop("LOCAL_MAX_SIZE", 10_000)
+        local_ttl = options.pop("LOCAL_TTL", 5)
+        channel = options.pop("INVALIDATION_CHANNEL", "cache-invalidation")
+        self.flight_timeout = options.pop("SINGLE_FLIGHT_TIMEOUT", 5)
+        reconnect_interval = options.pop("RECONNECT_INTERVAL", 1)
+        # the remaining options configure the redis client as usual
+        super().__init__(server, {**params, "OPTIONS": options})
+
+        self._tier = get_local_tier(
+            self._servers,
+            channel,
+            max_size=local_max_size,
+            ttl=local_ttl,
+            reconnect_interval=reconnect_interval,
+        )
+
+    def _ensure_listener(self):
+        self._tier.ensure_listener(self._cache)
+
+    def _invalidate(self, keys=None):
+        self._ensure_listener()
+        self._tier.drop(keys)
+        try:
+            message = json.dumps({"sender": self._tier.sender, "keys": keys})
+            self._cache.get_client(None, write=True).publish(self._tier.channel, message)
+        except self._cache._lib.RedisError:
+            # other workers catch up once their local entries expire
+            logger.exception("Failed to publish a cache invalidation")
+
+    def _get_local(self, key):
+        self._ensure_listener()
+        if not self._tier.subscribed:
+            return MISSING
+        return self._tier.local.get(key, MISSING)
+
+    def _set_local(self, key, raw, generation: int):
+        # a value read before an invalidation may already be stale
+        if raw is not None and self._tier.subscribed and generation == self._tier.generation:
+            self._tier.local.set(key, raw)
+
+    def _fetch(self, key):
+        generation = self._tier.generation
+        raw = self._cache.get_client(key).get(key)
+        if raw is None:
+            self._tier.redis_misses += 1
+        else:
+            self._tier.redis_hits += 1
+        self._set_local(key, raw, generation)
+        return raw
+
+    def _fetch_once(self, key):
+        # concurrent misses of a key in this process wait for a single redis round trip
+        with self._tier.lock:
+            flight = self._tier.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._tier.flights[key] = Flight()
+
+        if not leader:
+            if flight.event.wait(self.flight_timeout) and not flight.failed:
+                self._tier.coalesced += 1
+                return flight.value
+            return self._fetch(key)
+
+        try:
+            flight.value = self._fetch(key)
+            return flight.value
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._tier.lock:
+                self._tier.flights.pop(key, None)
+            flight.event.set()
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw = self._get_local(key)
+        if raw is MISSING:
+            raw = self._fetch_once(key)
+        return default if raw is None else self._cache._serializer.loads(raw)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        found = {}
+        missing = []
+        for key in key_map:
+            raw = self._get_local(key)
+            if raw is MISSING:
+                missing.append(key)
+            else:
+                found[key] = raw
+
+        if missing:
+            generation = self._tier.generation
+            for key, raw in zip(missing, self._cache.get_client(None).mget(missing)):
+                if raw is None:
+                    self._tier.redis_misses += 1
+                    continue
+                self._tier.redis_hits += 1
+                found[key] = raw
+                self._set_local(key, raw, generation)
+
+        return {key_map[key]: self._cache._serializer.loads(raw) for key, raw in found.items()}
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version)
+        if added:
+            self._invalidate([self.make_key(key, version=version)])
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version)
+        self._invalidate([self.make_key(key, version=version)])
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._invalidate([self.make_key(key, version=version)])
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._invalidate([self.make_key(key, version=version)])
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version)
+        if data:
+            self._invalidate([self.make_key(key, version=version) for key in data])
+        return failed
+
+    def delete_many(self, keys, version=None):
+        super().delete_many(keys, version)
+        if keys:
+            self._invalidate([self.make_key(key, version=version) for key in keys])
+
+    def clear(self):
+        cleared = super().clear()
+        self._invalidate()
+        return cleared
+
+    def stats(self) -> dict:
+        tier = self._tier
+        redis_requests = tier.redis_hits + tier.redis_misses
+        return {
+            "local": tier.local.stats(),
+            "redis": {
+                "hits": tier.redis_hits,
+                "misses": tier.redis_misses,
+                "hit_ratio": tier.redis_hits / redis_requests if redis_requests else 0.0,
+            },
+            "coalesced": tier.coalesced,
+            "invalidations": tier.invalidations,
+            "subscribed": tier.subscribed,
+        }
@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+connection_metrics = ContextVar("connection_metrics", default=None)
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.opened = 0
+        self.setup_time = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record_connection(self, duration: float):
+        with self._lock:
+            self.opened += 1
+            self.setup_time += duration
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def stats(self) -> dict:
+        return {
+            "opened": self.opened,
+            "requests": self.requests,
+            "setup_ms": round(self.setup_time * 1000, 1),
+            # share of requests served over an already open connection
+            "reuse_ratio": round(1 - self.opened / self.requests, 3) if self.requests else None,
+        }
+
+
+connection_stats = ConnectionStats()
+
+
+class ConnectionMetricsMixin:
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        duration = time.perf_counter() - started
+
+        connection_stats.record_connection(duration)
+        metrics = connection_metrics.get()
+        if metrics is not None:
+            metrics["connect"] += duration
+        logger.info("Opened a %s connection in %.1fms %s", self.alias, duration * 1000, connection_stats.stats())
+        return connection
+
+
+class ConnectionMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = {"connect": 0.0}
+        token = connection_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            connection_metrics.reset(token)
+        connection_stats.record_request()
+
+        if metrics["connect"]:
+            timing = f"db-connect;dur={metrics['connect'] * 1000:.1f}"
+            response["Server-Timing"] = ", ".join(filter(None, (response.get("Server-Timing"), timing)))
+        return response
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from mentoring.connections import ConnectionMetricsMixin
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, base.DatabaseWrapper):
+    pass
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
+import os
 import sys
 
 import environ
@@ -27,9 +28,22 @@ env.read_env(BASE_DIR / ".env")
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
 SECRET_KEY = env.str("SECRET_KEY")
-PRIVATE_KEY = open("private.pem").read()
-PUBLIC_KEY = open("public.pem").read()
-# JWT_ALGORITHM = ""
+JWT_PRIVATE_KEY_PATH = env.str("JWT_PRIVATE_KEY_PATH", default="private.pem")
+JWT_PUBLIC_KEY_PATH = env.str("JWT_PUBLIC_KEY_PATH", default="public.pem")
+# when set, every <kid>.pem in the directory is loaded instead of the key paths above
+JWT_KEYS_DIR = env.str("JWT_KEYS_DIR", default="")
+JWT_ALGORITHM = env.str("JWT_ALGORITHM", default="RS256")
+JWT_KEY_ID = env.str("JWT_KEY_ID", default="default")
+# tokens issued without a kid header are verified with this key
+JWT_LEGACY_KEY_ID = env.str("JWT_LEGACY_KEY_ID", default=JWT_KEY_ID)
+# previous keys that are still accepted, as "kid:algorithm:public_key_path,..."
+JWT_PREVIOUS_KEYS = {
+    _kid: {"ALGORITHM": _algorithm, "PUBLIC_KEY_PATH": _path}
+    for _kid, _algorithm, _path in (_key.split(":", 2) for _key in env.list("JWT_PREVIOUS_KEYS", default=[]))
+}
+# how long a replaced public key keeps verifying tokens after a key rotation
+JWT_KEY_GRACE_PERIOD = env.int("JWT_KEY_GRACE_PERIOD", default=24 * 3_600)
+JWT_KEYRING_CHECK_INTERVAL = env.int("JWT_KEYRING_CHECK_INTERVAL", default=10)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool("DEBUG")
@@ -52,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "mentoring.connections.ConnectionMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,6 +74,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "user.hashing.HashingMetricsMiddleware",
 ]
 
 ROOT_URLCONF = "mentoring.urls"
@@ -85,15 +101,23 @@ WSGI_APPLICATION = "mentoring.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# the postgresql backend with connection setup metrics, connections are kept open and health checked on reuse
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "mentoring.postgresql",
         "NAME": env.str("POSTGRES_NAME"),
         "USER": env.str("POSTGRES_USER"),
         "PASSWORD": env.str("POSTGRES_PASSWORD"),
         "HOST": env.str("POSTGRES_HOST"),
         "PORT": env.int("POSTGRES_PORT"),
-        "OPTIONS": {"options": "-c search_path=auth"},
+        # reused by the gthread workers of the api and by the executor threads of the asgi verify endpoint,
+        # django 4 runs any other asgi request in a new thread whose connection is never reused
+        "CONN_MAX_AGE": env.int("POSTGRES_CONN_MAX_AGE", default=600),
+        "CONN_HEALTH_CHECKS": env.bool("POSTGRES_CONN_HEALTH_CHECKS", default=True),
+        "OPTIONS": {
+            "options": "-c search_path=auth",
+            "connect_timeout": env.int("POSTGRES_CONNECT_TIMEOUT", default=5),
+        },
     }
 }
 
@@ -118,6 +142,22 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHERS = [
+    "user.hashing.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# password hashing runs in a bounded pool, requests fail with 503 once the queue is full
+HASHING_POOL = {
+    "EXECUTOR": env.str("HASHING_POOL_EXECUTOR", default="thread"),
+    "MAX_WORKERS": env.int("HASHING_POOL_MAX_WORKERS", default=os.cpu_count() or 1),
+    "QUEUE_SIZE": env.int("HASHING_POOL_QUEUE_SIZE", default=2 * (os.cpu_count() or 1)),
+    "RETRY_AFTER": env.int("HASHING_POOL_RETRY_AFTER", default=1),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
@@ -161,18 +201,75 @@ EMAIL_BACKEND = env.str("EMAIL_BACKEND")
 
 SITE_URL = env.str("SITE_URL")
 
+# login tokens are short-lived, clients renew them with a rotating refresh token
 TOKEN_EXPIRES = {
-    "login": 24 * 3_600,
+    "login": env.int("ACCESS_TOKEN_TTL", default=15 * 60),
     "activate": 1 * 3_600,
     "password": 1 * 3_600,
+    "refresh": env.int("REFRESH_TOKEN_TTL", default=30 * 24 * 3_600),
+}
+
+# a refresh token presented again within this many seconds is taken for a retry of a lost response, not a replay
+REFRESH_TOKEN_REUSE_GRACE = env.int("REFRESH_TOKEN_REUSE_GRACE", default=30)
+
+TOKEN_CACHE = {
+    "MAX_SIZE": env.int("TOKEN_CACHE_MAX_SIZE", default=10_000),
+    "TTL": env.int("TOKEN_CACHE_TTL", default=5 * 60),
+}
+
+USER_SNAPSHOT_CACHE = {
+    "MAX_SIZE": env.int("USER_SNAPSHOT_CACHE_MAX_SIZE", default=10_000),
+    "LOCAL_TTL": env.int("USER_SNAPSHOT_CACHE_LOCAL_TTL", default=5),
+    "TTL": env.int("USER_SNAPSHOT_CACHE_TTL", default=5 * 60),
+}
+
+TOKEN_DENYLIST = {
+    "CAPACITY": env.int("TOKEN_DENYLIST_CAPACITY", default=100_000),
+    "ERROR_RATE": env.float("TOKEN_DENYLIST_ERROR_RATE", default=0.001),
+    "SYNC_INTERVAL": env.int("TOKEN_DENYLIST_SYNC_INTERVAL", default=5),
+}
+
+# downstream services may cache an active introspection result for up to CACHE_TTL seconds
+INTROSPECTION = {
+    "MAX_TOKENS": env.int("INTROSPECTION_MAX_TOKENS", default=100),
+    "CACHE_TTL": env.int("INTROSPECTION_CACHE_TTL", default=30),
 }
 
 TESTING = "test" in sys.argv
 
+# revocations are mirrored to redis for the services that verify tokens without calling auth
+TOKEN_REVOCATION_FEED = {
+    "REDIS_URL": env.str("REDIS_URL", default="redis://redis:6379"),
+    "KEY": env.str("TOKEN_REVOCATION_KEY", default="token-revocations"),
+    "CHANNEL": env.str("TOKEN_REVOCATION_CHANNEL", default="token-revocations"),
+    "ENABLED": env.bool("TOKEN_REVOCATION_FEED_ENABLED", default=not TESTING),
+}
+
+# "user.message_sender.QueuedEmailSender" sends emails from a background worker
+MESSAGE_SENDER = env.str("MESSAGE_SENDER", default="user.message_sender.EmailSender")
+
+EMAIL_QUEUE = {
+    "BATCH_SIZE": env.int("EMAIL_QUEUE_BATCH_SIZE", default=50),
+    "MAX_ATTEMPTS": env.int("EMAIL_QUEUE_MAX_ATTEMPTS", default=5),
+    "RETRY_BACKOFF": env.int("EMAIL_QUEUE_RETRY_BACKOFF", default=30),
+    "POLL_INTERVAL": env.int("EMAIL_QUEUE_POLL_INTERVAL", default=10),
+    # claimed messages are retried once a crashed worker's claim runs out
+    "CLAIM_TIMEOUT": env.int("EMAIL_QUEUE_CLAIM_TIMEOUT", default=300),
+    # start a worker thread in every web process, disable when running process_email_queue instead
+    "AUTOSTART": env.bool("EMAIL_QUEUE_AUTOSTART", default=not TESTING),
+}
+
+# an in-process LRU in front of redis, kept coherent across workers through pub/sub invalidations
 if not TESTING:
     CACHES = {
         "default": {
-            "BACKEND": "django.core.cache.backends.redis.RedisCache",
-            "LOCATION": "redis://redis:6379",
+            "BACKEND": "mentoring.cache.TwoTierCache",
+            "LOCATION": TOKEN_REVOCATION_FEED["REDIS_URL"],
+            "OPTIONS": {
+                "LOCAL_MAX_SIZE": env.int("CACHE_LOCAL_MAX_SIZE", default=10_000),
+                "LOCAL_TTL": env.int("CACHE_LOCAL_TTL", default=5),
+                "INVALIDATION_CHANNEL": env.str("CACHE_INVALIDATION_CHANNEL", default="cache-invalidation"),
+                "SINGLE_FLIGHT_TIMEOUT": env.int("CACHE_SINGLE_FLIGHT_TIMEOUT", default=5),
+            },
         }
     }
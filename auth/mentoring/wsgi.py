@@ -13,4 +13,14 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mentoring.settings")
 
-application = get_wsgi_application()
+django_application = get_wsgi_application()
+
+# imported once the app registry is ready
+from user.verification import VERIFY_PATH, verify_wsgi_application  # noqa: E402
+
+
+def application(environ, start_response):
+    # token verification skips the django and DRF stack, as in mentoring.asgi
+    if environ["PATH_INFO"].rstrip("/") == VERIFY_PATH:
+        return verify_wsgi_application(environ, start_response)
+    return django_application(environ, start_response)
@@ -1,15 +1,16 @@
-import jwt
 import re
 
-from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
-from django.core.cache import cache
 
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from user.cache import token_cache, token_digest
 from user.constants import ErrorMessages, MIN_PASSWORD_LENGTH
+from user.denylist import is_token_revoked, revoke_token
 from user.models import User
+from user.snapshots import get_user_snapshot
+from user.tokens import verify_token
 
 
 class CustomModelBackend(ModelBackend):
@@ -49,22 +50,29 @@ class JWTAuthentication(authentication.BaseAuthentication):
 
 
 def decode_token(token: str):
-    return jwt.decode(token, settings.PUBLIC_KEY, algorithms="RS256")
+    key = token_digest(token)
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = verify_token(token)
+        token_cache.set(key, payload, expires_at=payload.get("exp"))
+    return dict(payload)
 
 
 def get_payload_user(payload: dict):
-    return User.objects.get(pk=payload["id"])
+    return get_user_snapshot(payload["id"])
 
 
 def validate_token(token: str, action: str, invalidate: bool = False):
-    if cache.get(token):
-        raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN)
-
     try:
         payload = decode_token(token)
     except Exception:
         raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN)
 
+    # single-use tokens must not be accepted again while other workers sync their filters
+    strict = invalidate or payload.get("action") != "login"
+    if is_token_revoked(token, payload, strict=strict):
+        raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN)
+
     if payload.get("action") != action:
         raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN_ACTION)
 
@@ -74,7 +82,7 @@ def validate_token(token: str, action: str, invalidate: bool = False):
         raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN_USER)
 
     if invalidate:
-        cache.set(token, user.pk, settings.TOKEN_EXPIRES[action])
+        revoke_token(token, payload)
 
     return user, token
 
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from django.conf import settings
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+
+        if self.ttl is not None:
+            ttl_expires_at = time.time() + self.ttl
+            expires_at = min(expires_at, ttl_expires_at) if expires_at else ttl_expires_at
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+        }
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+token_cache = LRUCache(
+    max_size=settings.TOKEN_CACHE["MAX_SIZE"],
+    ttl=settings.TOKEN_CACHE["TTL"],
+)
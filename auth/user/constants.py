@@ -32,6 +32,8 @@ class ErrorMessages:
     PASSWORD_IS_WRONG = "The old password is wrong"
     PASSWORD_THE_SAME = "The new password must be different from the old one"
 
+    SERVICE_BUSY = "The service is busy, please try again later."
+
 
 class EmailTemplates:
     templates = {
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import math
+import secrets
+import threading
+import time
+from typing import Optional
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DENYLIST_KEY_PREFIX = "token-denylist"
+SEQUENCE_KEY = f"{DENYLIST_KEY_PREFIX}:seq"
+# every entry at or below the floor has expired, shared so that new workers do not scan them again
+FLOOR_KEY = f"{DENYLIST_KEY_PREFIX}:floor"
+SYNC_CHUNK_SIZE = 1_000
+PENDING_RETRIES = 3
+
+
+def generate_jti() -> str:
+    return secrets.token_urlsafe(12)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def is_saturated(self) -> bool:
+        return self.count > self.capacity
+
+
+class TokenDenylist:
+    def __init__(self, capacity: int, error_rate: float, sync_interval: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._floor = 0
+        self._last_seq = 0
+        self._pending = {}
+        self._synced_at = None
+        self._sync_lock = threading.Lock()
+
+    @staticmethod
+    def get_key(jti: str) -> str:
+        return f"{DENYLIST_KEY_PREFIX}:jti:{jti}"
+
+    @staticmethod
+    def get_entry_key(seq: int) -> str:
+        return f"{DENYLIST_KEY_PREFIX}:entry:{seq}"
+
+    def revoke(self, jti: str, expires_at: int):
+        ttl = max(1, int(expires_at - time.time()))
+        cache.set(self.get_key(jti), 1, ttl)
+        cache.add(SEQUENCE_KEY, 0, None)
+        seq = cache.incr(SEQUENCE_KEY)
+        cache.set(self.get_entry_key(seq), jti, ttl)
+        self._filter.add(jti)
+
+    def might_be_revoked(self, jti: str) -> bool:
+        self.sync()
+        return jti in self._filter
+
+    def is_revoked(self, jti: str, strict: bool = False) -> bool:
+        # the filter of another worker lags behind by up to sync_interval, strict checks always ask the cache
+        if not strict and not self.might_be_revoked(jti):
+            return False
+        return cache.get(self.get_key(jti)) is not None
+
+    def is_known_not_revoked(self, jti: str) -> bool:
+        # answers without I/O while the filter is fresh, False means is_revoked has to be asked
+        if self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval:
+            return False
+        return jti not in self._filter
+
+    def sync(self, force: bool = False):
+        if not force and self._synced_at and time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            seq = cache.get(SEQUENCE_KEY, 0)
+            if self._synced_at is None or seq < self._last_seq or self._filter.is_saturated:
+                self._rebuild(seq)
+            else:
+                sequence = sorted(self._pending) + list(range(self._last_seq + 1, seq + 1))
+                self._load(sequence, self._filter, track_pending=True)
+            self._last_seq = seq
+            self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def _load(self, sequence: list, bloom_filter: BloomFilter, track_pending: bool = False) -> list:
+        found = []
+        for start in range(0, len(sequence), SYNC_CHUNK_SIZE):
+            chunk = sequence[start : start + SYNC_CHUNK_SIZE]
+            entries = cache.get_many([self.get_entry_key(seq) for seq in chunk])
+            for seq in chunk:
+                jti = entries.get(self.get_entry_key(seq))
+                if jti is not None:
+                    bloom_filter.add(jti)
+                    found.append(seq)
+                    self._pending.pop(seq, None)
+                elif track_pending:
+                    # the revoking worker may not have written the entry yet
+                    retries = self._pending.get(seq, PENDING_RETRIES) - 1
+                    if retries > 0:
+                        self._pending[seq] = retries
+                    else:
+                        self._pending.pop(seq, None)
+        return found
+
+    def _rebuild(self, seq: int):
+        bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        floor = max(self._floor, cache.get(FLOOR_KEY, 0)) if seq >= self._last_seq else 0
+        if floor > seq:
+            # the sequence was reset along with the cache
+            floor = 0
+        self._pending = {}
+        found = self._load(list(range(floor + 1, seq + 1)), bloom_filter)
+        self._floor = found[0] - 1 if found else seq
+        if self._floor > floor:
+            cache.set(FLOOR_KEY, self._floor, None)
+        self._filter = bloom_filter
+
+    def stats(self) -> dict:
+        return {
+            "entries": self._filter.count,
+            "capacity": self.capacity,
+            "last_seq": self._last_seq,
+            "pending": len(self._pending),
+        }
+
+
+token_denylist = TokenDenylist(
+    capacity=settings.TOKEN_DENYLIST["CAPACITY"],
+    error_rate=settings.TOKEN_DENYLIST["ERROR_RATE"],
+    sync_interval=settings.TOKEN_DENYLIST["SYNC_INTERVAL"],
+)
+
+
+class RevocationFeed:
+    # other services mirror revocations from a sorted set snapshot plus a pub/sub channel
+    def __init__(self, url: str, key: str, channel: str, enabled: bool):
+        self.url = url
+        self.key = key
+        self.channel = channel
+        self.enabled = enabled
+        self._client = None
+
+    def get_client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def publish(self, jti: str, expires_at: int):
+        if not self.enabled:
+            return
+        try:
+            pipeline = self.get_client().pipeline()
+            pipeline.zadd(self.key, {jti: expires_at})
+            pipeline.zremrangebyscore(self.key, "-inf", time.time())
+            pipeline.publish(self.channel, json.dumps({"jti": jti, "exp": expires_at}))
+            pipeline.execute()
+        except redis.RedisError:
+            # the local denylist stays authoritative for auth, subscribers catch up from the snapshot
+            logger.exception("Failed to publish the revocation of %s", jti)
+
+
+revocation_feed = RevocationFeed(
+    url=settings.TOKEN_REVOCATION_FEED["REDIS_URL"],
+    key=settings.TOKEN_REVOCATION_FEED["KEY"],
+    channel=settings.TOKEN_REVOCATION_FEED["CHANNEL"],
+    enabled=settings.TOKEN_REVOCATION_FEED["ENABLED"],
+)
+
+
+def get_revocation_key(token: str, payload: dict, strict: bool = False) -> Optional[str]:
+    # the cache key that marks the token as revoked, None when the filter already rules it out
+    jti = payload.get("jti")
+    if jti is None:
+        # tokens minted before jti was introduced are revoked by their full value
+        return token
+    if strict or token_denylist.might_be_revoked(jti):
+        return token_denylist.get_key(jti)
+    return None
+
+
+def is_token_revoked(token: str, payload: dict, strict: bool = False) -> bool:
+    key = get_revocation_key(token, payload, strict)
+    return key is not None and cache.get(key) is not None
+
+
+def revoke_token(token: str, payload: dict):
+    jti = payload.get("jti")
+    if jti is None:
+        cache.set(token, 1, max(1, int(payload["exp"] - time.time())))
+        return
+    token_denylist.revoke(jti, payload["exp"])
+    revocation_feed.publish(jti, payload["exp"])
@@ -0,0 +1,51 @@
+import csv
+import tempfile
+import uuid
+
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+EXPORT_CHUNK_SIZE = 2_000
+XLSX_MEMORY_LIMIT = 8 * 1024 * 1024
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset: QuerySet, fields: list):
+    yield fields
+    yield from queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_csv(queryset: QuerySet, fields: list, filename: str) -> StreamingHttpResponse:
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_rows(queryset, fields)),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def export_xlsx(queryset: QuerySet, fields: list, filename: str) -> FileResponse:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in iter_rows(queryset, fields):
+        sheet.append([str(value) if isinstance(value, uuid.UUID) else value for value in row])
+
+    # small exports stay in memory, large ones roll over to disk
+    file = tempfile.SpooledTemporaryFile(max_size=XLSX_MEMORY_LIMIT)
+    workbook.save(file)
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename=f"{filename}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+EXPORTERS = {"csv": export_csv, "xlsx": export_xlsx}
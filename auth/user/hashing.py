@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from user.constants import ErrorMessages
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+hashing_metrics = ContextVar("hashing_metrics", default=None)
+
+
+class PasswordHashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = ErrorMessages.SERVICE_BUSY
+    default_code = "service_busy"
+
+    def __init__(self, wait: int):
+        super().__init__()
+        self.wait = wait
+
+
+def _timed_call(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class HashingPool:
+    def __init__(self, executor: str, max_workers: int, queue_size: int, retry_after: int):
+        self.executor_class = EXECUTORS[executor]
+        self.max_workers = max_workers
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # executors are not inherited by forked workers, create them lazily per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = self.executor_class(max_workers=self.max_workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Password hashing queue is full")
+            raise PasswordHashingUnavailable(wait=self.retry_after)
+
+        submitted = time.perf_counter()
+        try:
+            result, compute = self._get_executor().submit(_timed_call, fn, *args).result()
+        finally:
+            self._slots.release()
+
+        metrics = hashing_metrics.get()
+        if metrics is not None:
+            metrics["wait"] += time.perf_counter() - submitted - compute
+            metrics["compute"] += compute
+        return result
+
+
+hashing_pool = HashingPool(
+    executor=settings.HASHING_POOL["EXECUTOR"],
+    max_workers=settings.HASHING_POOL["MAX_WORKERS"],
+    queue_size=settings.HASHING_POOL["QUEUE_SIZE"],
+    retry_after=settings.HASHING_POOL["RETRY_AFTER"],
+)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    def encode(self, password, salt, iterations=None):
+        return hashing_pool.run(PBKDF2PasswordHasher.encode, PBKDF2PasswordHasher(), password, salt, iterations)
+
+
+class HashingMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = {"wait": 0.0, "compute": 0.0}
+        token = hashing_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            hashing_metrics.reset(token)
+
+        if metrics["compute"]:
+            response["Server-Timing"] = (
+                f"hash-wait;dur={metrics['wait'] * 1000:.1f}, hash;dur={metrics['compute'] * 1000:.1f}"
+            )
+            logger.info(
+                "%s %s password hashing wait=%.1fms compute=%.1fms",
+                request.method,
+                request.path,
+                metrics["wait"] * 1000,
+                metrics["compute"] * 1000,
+            )
+        return response
@@ -0,0 +1,90 @@
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from user.backends import decode_token
+from user.constants import ErrorMessages
+from user.denylist import get_revocation_key
+from user.models import User
+from user.snapshots import SNAPSHOT_FIELDS, UserSnapshot, get_snapshot_key, local_snapshots
+
+PRINCIPAL_FIELDS = ("id", "email", "username", "is_staff")
+
+
+def serialize_principal(user: UserSnapshot) -> dict:
+    principal = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    principal["id"] = str(principal["id"])
+    return principal
+
+
+def introspect(payload: Optional[dict], revoked: bool, user: Optional[UserSnapshot]) -> dict:
+    # the checks and their errors follow validate_token and JWTAuthentication, /api/auth/verify shares them
+    if payload is None or revoked:
+        return {"active": False, "error": ErrorMessages.INVALID_TOKEN}
+    if payload.get("action") != "login":
+        return {"active": False, "error": ErrorMessages.INVALID_TOKEN_ACTION}
+    if user is None:
+        return {"active": False, "error": ErrorMessages.INVALID_TOKEN_USER}
+    if not user.is_active:
+        return {"active": False, "error": ErrorMessages.USER_IS_DEACTIVATED}
+    return {"active": True, **serialize_principal(user), "exp": payload["exp"]}
+
+
+def introspect_tokens(tokens: list) -> list:
+    payloads = {}
+    for token in tokens:
+        try:
+            payloads[token] = decode_token(token)
+        except Exception:
+            payloads[token] = None
+
+    revocation_keys = {token: get_revocation_key(token, payload) for token, payload in payloads.items() if payload}
+    pks = {
+        str(payload["id"])
+        for payload in payloads.values()
+        if payload and payload.get("action") == "login" and payload.get("id")
+    }
+    snapshots = {pk: local_snapshots.get(get_snapshot_key(pk)) for pk in pks}
+
+    # revocations and shared snapshots come from a single MGET, missing users from a single query
+    keys = [key for key in revocation_keys.values() if key is not None]
+    keys += [get_snapshot_key(pk) for pk, values in snapshots.items() if values is None]
+    cached = cache.get_many(keys) if keys else {}
+
+    missing = []
+    for pk, values in snapshots.items():
+        if values is None:
+            snapshots[pk] = cached.get(get_snapshot_key(pk))
+            if snapshots[pk] is None:
+                missing.append(pk)
+    if missing:
+        loaded = {str(row[0]): row for row in User.objects.filter(pk__in=missing).values_list(*SNAPSHOT_FIELDS)}
+        cache.set_many(
+            {get_snapshot_key(pk): values for pk, values in loaded.items()}, settings.USER_SNAPSHOT_CACHE["TTL"]
+        )
+        snapshots.update(loaded)
+
+    users = {}
+    for pk, values in snapshots.items():
+        if values is not None:
+            local_snapshots.set(get_snapshot_key(pk), values)
+            users[pk] = UserSnapshot(*values)
+
+    return [
+        introspect(
+            payload=payloads[token],
+            revoked=cached.get(revocation_keys.get(token)) is not None,
+            user=users.get(str(payloads[token].get("id"))) if payloads[token] else None,
+        )
+        for token in tokens
+    ]
+
+
+def get_cache_ttl(results: list) -> int:
+    now = time.time()
+    expires = [result["exp"] - now for result in results if result["active"]]
+    if not expires:
+        return 0
+    return max(0, min(settings.INTROSPECTION["CACHE_TTL"], int(min(expires))))
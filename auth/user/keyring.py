@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+RSA_ALGORITHMS = ("RS256", "PS256")
+PRIVATE_KEY_TYPES = (rsa.RSAPrivateKey, ec.EllipticCurvePrivateKey, ed25519.Ed25519PrivateKey)
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    key: object
+
+
+class VerificationKey(NamedTuple):
+    algorithm: str
+    key: object
+    fingerprint: bytes
+    expires_at: Optional[float] = None
+
+
+class KeySet(NamedTuple):
+    signing_key: SigningKey
+    verification_keys: dict
+
+
+def get_key_algorithm(key, preferred: str) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return preferred if preferred in RSA_ALGORITHMS else RSA_ALGORITHMS[0]
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name == "secp256r1":
+        return "ES256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ImproperlyConfigured(f"Unsupported key type {key.__class__.__name__}")
+
+
+def get_fingerprint(public_key) -> bytes:
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+def load_key(path: Path):
+    data = path.read_bytes()
+    if b"PRIVATE KEY" in data:
+        return serialization.load_pem_private_key(data, password=None)
+    return serialization.load_pem_public_key(data)
+
+
+class KeyRing:
+    def __init__(
+        self,
+        key_id: str,
+        algorithm: str,
+        private_key_path: str = None,
+        public_key_path: str = None,
+        previous_keys: dict = None,
+        keys_dir: str = None,
+        grace_period: int = 0,
+        check_interval: int = 0,
+    ):
+        self.key_id = key_id
+        self.algorithm = algorithm
+        self.private_key_path = Path(private_key_path) if private_key_path else None
+        self.public_key_path = Path(public_key_path) if public_key_path else None
+        self.previous_keys = previous_keys or {}
+        self.keys_dir = Path(keys_dir) if keys_dir else None
+        self.grace_period = grace_period
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtimes = self._get_mtimes()
+        self._key_set = self._load()
+        self._checked_at = time.monotonic()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            key_id=settings.JWT_KEY_ID,
+            algorithm=settings.JWT_ALGORITHM,
+            private_key_path=settings.JWT_PRIVATE_KEY_PATH,
+            public_key_path=settings.JWT_PUBLIC_KEY_PATH,
+            previous_keys=settings.JWT_PREVIOUS_KEYS,
+            keys_dir=settings.JWT_KEYS_DIR,
+            grace_period=settings.JWT_KEY_GRACE_PERIOD,
+            check_interval=settings.JWT_KEYRING_CHECK_INTERVAL,
+        )
+
+    def get_signing_key(self) -> SigningKey:
+        self.refresh()
+        return self._key_set.signing_key
+
+    def get_verification_keys(self, kid: str) -> list:
+        self.refresh()
+        now = time.time()
+        keys = self._key_set.verification_keys.get(kid, [])
+        return [key for key in keys if key.expires_at is None or key.expires_at > now]
+
+    def refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            mtimes = self._get_mtimes()
+            if mtimes == self._mtimes:
+                return
+            try:
+                key_set = self._load()
+            except (OSError, ValueError, ImproperlyConfigured):
+                # keep serving the current keys while the files are being replaced
+                logger.exception("Failed to reload JWT keys")
+                return
+            self._key_set = self._with_retired_keys(key_set)
+            self._mtimes = mtimes
+            logger.info("Reloaded JWT keys, signing with %s", key_set.signing_key.kid)
+        finally:
+            self._lock.release()
+
+    def _get_paths(self) -> list:
+        if self.keys_dir:
+            return sorted(self.keys_dir.glob("*.pem"))
+        paths = [self.private_key_path, self.public_key_path]
+        paths += [Path(key["PUBLIC_KEY_PATH"]) for key in self.previous_keys.values()]
+        return [path for path in paths if path]
+
+    def _get_mtimes(self) -> dict:
+        mtimes = {}
+        for path in self._get_paths():
+            try:
+                mtimes[path] = path.stat().st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _load(self) -> KeySet:
+        if self.keys_dir:
+            return self._load_dir()
+
+        signing_key = load_key(self.private_key_path)
+        public_key = signing_key.public_key()
+        # the two files are not replaced atomically, a reload in between must not verify with another key
+        if self.public_key_path and get_fingerprint(load_key(self.public_key_path)) != get_fingerprint(public_key):
+            raise ImproperlyConfigured(f"{self.public_key_path} does not match {self.private_key_path}")
+        algorithm = get_key_algorithm(signing_key, self.algorithm)
+        if algorithm != self.algorithm:
+            raise ImproperlyConfigured(f"JWT_ALGORITHM {self.algorithm} does not match the {algorithm} private key")
+
+        verification_keys = {self.key_id: [VerificationKey(algorithm, public_key, get_fingerprint(public_key))]}
+        for kid, previous_key in self.previous_keys.items():
+            key = load_key(Path(previous_key["PUBLIC_KEY_PATH"]))
+            verification_keys.setdefault(kid, []).append(
+                VerificationKey(previous_key["ALGORITHM"], key, get_fingerprint(key))
+            )
+        return KeySet(SigningKey(self.key_id, algorithm, signing_key), verification_keys)
+
+    def _load_dir(self) -> KeySet:
+        private_keys, verification_keys = {}, {}
+        for path in self._get_paths():
+            kid = path.stem
+            key = load_key(path)
+            if isinstance(key, PRIVATE_KEY_TYPES):
+                private_keys[kid] = (path.stat().st_mtime_ns, key)
+                public_key = key.public_key()
+            else:
+                public_key = key
+            algorithm = get_key_algorithm(public_key, self.algorithm)
+            verification_keys[kid] = [VerificationKey(algorithm, public_key, get_fingerprint(public_key))]
+
+        if not private_keys:
+            raise ImproperlyConfigured(f"No private key found in {self.keys_dir}")
+
+        kid = self.key_id if self.key_id in private_keys else max(private_keys, key=lambda k: private_keys[k][0])
+        signing_key = private_keys[kid][1]
+        return KeySet(SigningKey(kid, get_key_algorithm(signing_key, self.algorithm), signing_key), verification_keys)
+
+    def _with_retired_keys(self, key_set: KeySet) -> KeySet:
+        now = time.time()
+        expires_at = now + self.grace_period
+        verification_keys = {kid: list(keys) for kid, keys in key_set.verification_keys.items()}
+
+        for kid, keys in self._key_set.verification_keys.items():
+            fingerprints = {key.fingerprint for key in verification_keys.get(kid, [])}
+            for key in keys:
+                if key.fingerprint in fingerprints or (key.expires_at and key.expires_at <= now):
+                    continue
+                retired_key = key._replace(expires_at=min(key.expires_at or expires_at, expires_at))
+                verification_keys.setdefault(kid, []).append(retired_key)
+
+        return KeySet(key_set.signing_key, verification_keys)
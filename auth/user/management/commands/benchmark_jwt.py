@@ -0,0 +1,48 @@
+import time
+import uuid
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from django.core.management.base import BaseCommand, CommandError
+
+from user.tokens import SUPPORTED_ALGORITHMS
+
+KEY_FACTORIES = {
+    "RS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "PS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "EdDSA": ed25519.Ed25519PrivateKey.generate,
+}
+
+
+class Command(BaseCommand):
+    help = "Report JWT sign/verify operations per second for every supported algorithm"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=1_000)
+        parser.add_argument("--algorithms", nargs="+", default=list(SUPPORTED_ALGORITHMS))
+
+    def handle(self, *args, **options):
+        unknown = set(options["algorithms"]) - set(SUPPORTED_ALGORITHMS)
+        if unknown:
+            raise CommandError(f"Unsupported algorithms: {', '.join(sorted(unknown))}")
+
+        iterations = options["iterations"]
+        payload = {"id": str(uuid.uuid4()), "action": "login", "exp": int(time.time()) + 3_600}
+
+        self.stdout.write(f"{'algorithm':<10}{'sign ops/s':>14}{'verify ops/s':>14}")
+        for algorithm in options["algorithms"]:
+            private_key = KEY_FACTORIES[algorithm]()
+            public_key = private_key.public_key()
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                token = jwt.encode(payload, private_key, algorithm=algorithm)
+            sign_rate = iterations / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                jwt.decode(token, public_key, algorithms=[algorithm])
+            verify_rate = iterations / (time.perf_counter() - started)
+
+            self.stdout.write(f"{algorithm:<10}{sign_rate:>14,.0f}{verify_rate:>14,.0f}")
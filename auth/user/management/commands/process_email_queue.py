@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from user.message_sender import email_queue_worker
+
+
+class Command(BaseCommand):
+    help = "Send queued emails, once or continuously"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            processed = email_queue_worker.drain()
+            self.stdout.write(f"Processed {processed} emails")
+            return
+        email_queue_worker.run()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from user.models import RefreshToken
+
+
+class Command(BaseCommand):
+    help = "Delete expired refresh tokens"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Deleted {RefreshToken.objects.purge_expired()} expired refresh tokens")
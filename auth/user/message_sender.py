@@ -1,11 +1,21 @@
+import logging
+import os
+import threading
 from abc import ABC, abstractmethod
+from datetime import timedelta
 
+from django.apps import apps
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
 
 from pydantic import BaseModel
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 
 class Message(BaseModel):
     subject: Optional[str]
@@ -33,4 +43,143 @@ class EmailSender(BaseMessageSender):
         )
 
 
-email_sender = EmailSender()
+class EmailQueueWorker:
+    sender = settings.DEFAULT_EMAIL_SENDER
+
+    def __init__(
+        self, batch_size: int, max_attempts: int, retry_backoff: int, poll_interval: int, claim_timeout: int = 300
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            # a thread started before a fork does not exist in the child process
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name="email-queue", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self.start()
+        self._wake_event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Failed to drain the email queue")
+            finally:
+                close_old_connections()
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+
+    def drain(self) -> int:
+        processed = 0
+        while True:
+            batch_size = self.process_batch()
+            processed += batch_size
+            if batch_size < self.batch_size:
+                return processed
+
+    def process_batch(self) -> int:
+        outbound_message = apps.get_model("user", "OutboundMessage")
+
+        messages = self._claim(outbound_message)
+        if not messages:
+            return 0
+
+        # no transaction or row lock is held while talking to the mail server
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            for message in messages:
+                self._send(connection, message)
+        except Exception as e:
+            # the connection could not be opened, retry the whole batch later
+            for message in messages:
+                if message.status == outbound_message.Status.PENDING:
+                    self._schedule_retry(message, e)
+        finally:
+            connection.close()
+
+        with transaction.atomic():
+            outbound_message.objects.bulk_update(
+                messages, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+            )
+
+        return len(messages)
+
+    def _claim(self, outbound_message) -> list:
+        # pushing next_attempt_at past the claim timeout hides the rows from other workers once committed
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                outbound_message.objects.select_for_update(skip_locked=True)
+                .filter(status=outbound_message.Status.PENDING, next_attempt_at__lte=now)
+                .order_by("next_attempt_at", "id")[: self.batch_size]
+            )
+            if messages:
+                outbound_message.objects.filter(pk__in=[message.pk for message in messages]).update(
+                    next_attempt_at=now + timedelta(seconds=self.claim_timeout)
+                )
+        return messages
+
+    def _send(self, connection, message):
+        try:
+            EmailMessage(
+                subject=message.subject,
+                body=message.body,
+                from_email=self.sender,
+                to=[message.recipient],
+                connection=connection,
+            ).send()
+        except Exception as e:
+            self._schedule_retry(message, e)
+            return
+
+        message.status = message.Status.SENT
+        message.attempts += 1
+        message.sent_at = timezone.now()
+        message.last_error = None
+
+    def _schedule_retry(self, message, error: Exception):
+        message.attempts += 1
+        message.last_error = repr(error)
+        if message.attempts >= self.max_attempts:
+            message.status = message.Status.FAILED
+            logger.error("Giving up on email %s after %s attempts: %r", message.pk, message.attempts, error)
+            return
+        message.next_attempt_at = timezone.now() + timedelta(seconds=self.retry_backoff * 2 ** (message.attempts - 1))
+
+
+email_queue_worker = EmailQueueWorker(
+    batch_size=settings.EMAIL_QUEUE["BATCH_SIZE"],
+    max_attempts=settings.EMAIL_QUEUE["MAX_ATTEMPTS"],
+    retry_backoff=settings.EMAIL_QUEUE["RETRY_BACKOFF"],
+    poll_interval=settings.EMAIL_QUEUE["POLL_INTERVAL"],
+    claim_timeout=settings.EMAIL_QUEUE["CLAIM_TIMEOUT"],
+)
+
+
+class QueuedEmailSender(BaseMessageSender):
+    def send_message(self, user, message: Message):
+        self._queue_email(email=user.email, message=message)
+
+    def _queue_email(self, email: str, message: Message):
+        outbound_message = apps.get_model("user", "OutboundMessage")
+        outbound_message.objects.create(recipient=email, subject=message.subject, body=message.body)
+        if settings.EMAIL_QUEUE["AUTOSTART"]:
+            transaction.on_commit(email_queue_worker.wake)
+
+
+email_sender = import_string(settings.MESSAGE_SENDER)()
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:35
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('first_name', models.Value('')), models.F('id'), name='user_first_name_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('last_name', models.Value('')), models.F('id'), name='user_last_name_keyset_idx'),
+        ),
+    ]
@@ -1,11 +1,12 @@
+import hashlib
+import secrets
 import uuid
 
-import jwt
-
 from datetime import datetime, timedelta
+from typing import Optional
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.conf import settings
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -13,11 +14,17 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 
 from user.constants import ErrorMessages, EmailTemplates
+from user.denylist import generate_jti
 from user.message_sender import email_sender
+from user.snapshots import invalidate_user_snapshot
+from user.tokens import encode_token
 
 
 class UserManager(BaseUserManager):
@@ -49,14 +56,13 @@ class UserManager(BaseUserManager):
 def generate_token_by_pk(action: str, pk: uuid.UUID):
     dt = datetime.now() + timedelta(seconds=settings.TOKEN_EXPIRES[action])
 
-    token = jwt.encode(
+    token = encode_token(
         {
             "id": str(pk),
             "action": action,
             "exp": int(dt.strftime("%s")),
-        },
-        settings.PRIVATE_KEY,
-        algorithm="RS256",
+            "jti": generate_jti(),
+        }
     )
 
     return token
@@ -78,6 +84,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        # keyset pagination orders nullable names by COALESCE(name, '') and id
+        indexes = [
+            models.Index(Coalesce("first_name", Value("")), "id", name="user_first_name_keyset_idx"),
+            models.Index(Coalesce("last_name", Value("")), "id", name="user_last_name_keyset_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -112,9 +125,128 @@ class User(AbstractBaseUser, PermissionsMixin):
         return generate_token_by_pk(action=action, pk=self.pk)
 
 
+class OutboundMessage(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255, null=True)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient}"
+
+
+def hash_refresh_token(token: str) -> str:
+    # refresh tokens are random, a fast digest is enough to keep them unusable from a database dump
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class RefreshTokenManager(models.Manager):
+    def issue(self, user: User, family: uuid.UUID = None) -> str:
+        token = secrets.token_urlsafe(32)
+        self.create(
+            user=user,
+            token_hash=hash_refresh_token(token),
+            family=family or uuid.uuid4(),
+            expires_at=timezone.now() + timedelta(seconds=settings.TOKEN_EXPIRES["refresh"]),
+        )
+        return token
+
+    def rotate(self, token: str):
+        with transaction.atomic():
+            refresh_token = (
+                self.select_for_update().select_related("user").filter(token_hash=hash_refresh_token(token)).first()
+            )
+            if refresh_token is None or not refresh_token.is_valid:
+                return None, None
+            if refresh_token.used_at is None:
+                refresh_token.used_at = timezone.now()
+                refresh_token.save(update_fields=["used_at"])
+                return refresh_token.user, self.issue(refresh_token.user, family=refresh_token.family)
+
+            # a client retrying a refresh whose response was lost presents the token again shortly after, its
+            # unused successor is replaced instead of treating the retry as a replay
+            successor = self._get_retry_successor(refresh_token)
+            if successor is not None:
+                successor.revoked_at = timezone.now()
+                successor.save(update_fields=["revoked_at"])
+                return refresh_token.user, self.issue(refresh_token.user, family=refresh_token.family)
+
+        # an already rotated token was replayed, every token of its family is treated as stolen
+        self.revoke_family(refresh_token.family)
+        return None, None
+
+    def _get_retry_successor(self, refresh_token: "RefreshToken") -> Optional["RefreshToken"]:
+        if timezone.now() - refresh_token.used_at > timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE):
+            return None
+        successors = list(
+            self.select_for_update()
+            .filter(family=refresh_token.family, created_at__gte=refresh_token.used_at)
+            .order_by("created_at")
+        )
+        # once a successor was used the family moved on, the old token can only be a replay
+        if any(successor.used_at is not None for successor in successors):
+            return None
+        valid = [successor for successor in successors if successor.is_valid]
+        return valid[-1] if valid else None
+
+    def revoke(self, token: str, user_id):
+        family = (
+            self.filter(user_id=user_id, token_hash=hash_refresh_token(token)).values_list("family", flat=True).first()
+        )
+        if family is not None:
+            self.revoke_family(family)
+
+    def revoke_family(self, family: uuid.UUID):
+        self.filter(family=family, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+    def revoke_user(self, user: User):
+        self.filter(user=user, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+    def purge_expired(self) -> int:
+        return self.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class RefreshToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="refresh_tokens")
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(db_index=True)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RefreshTokenManager()
+
+    def __str__(self):
+        return f"{self.user_id} {self.family}"
+
+    @property
+    def is_valid(self) -> bool:
+        return self.revoked_at is None and self.expires_at > timezone.now()
+
+
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, created, **kwargs):
     if created:
         email_sender.send_message(
             instance, instance.get_email_message("ACTIVATE_ACCOUNT")
         )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_snapshot(sender, instance, **kwargs):
+    invalidate_user_snapshot(instance.pk)
@@ -0,0 +1,189 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Field, Func, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils.encoding import force_str
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_estimated_count(queryset) -> int:
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        return int(cursor.fetchone()[0][0]["Plan"]["Plan Rows"])
+
+
+class RowValue(Func):
+    # (a, b) > (c, d) is a single range bound on a composite index, an OR of comparisons is not
+    template = "(%(expressions)s)"
+    output_field = Field()
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    cursor_query_description = "The pagination cursor value."
+    limit_query_param = "limit"
+    limit_query_description = "Number of results to return per page."
+    count_query_param = "count"
+    count_query_description = "Include the total count: 'exact' or 'estimate'."
+    ordering_param = api_settings.ORDERING_PARAM
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    key_field = "id"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering_field, self.descending = self.get_ordering(request, queryset, view)
+        self.count = self.get_count(queryset, request)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+        descending = self.descending != reverse
+
+        queryset = queryset.annotate(_keyset=self.get_key_expression(queryset)).order_by(
+            *(f"-{field}" if descending else field for field in ("_keyset", self.key_field))
+        )
+        if cursor:
+            queryset = queryset.filter(self.get_cursor_condition(queryset, cursor, descending))
+
+        page = list(queryset[: self.limit + 1])
+        has_more = len(page) > self.limit
+        page = page[: self.limit]
+
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = page
+        return page
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_ordering(self, request, queryset, view):
+        ordering_fields = getattr(view, "ordering_fields", None) or []
+        # only the first ordering term is used for the keyset, the key field breaks ties
+        param = request.query_params.get(self.ordering_param, "").split(",")[0].strip()
+        field = param.lstrip("-")
+        if field in ordering_fields:
+            return field, param.startswith("-")
+        return self.key_field, False
+
+    def get_key_expression(self, queryset):
+        field = queryset.model._meta.get_field(self.ordering_field)
+        if field.null:
+            # NULLs can't be compared, sort them together with empty values
+            return Coalesce(F(self.ordering_field), Value(""))
+        return F(self.ordering_field)
+
+    def get_cursor_condition(self, queryset, cursor: dict, descending: bool):
+        ordering_field = queryset.model._meta.get_field(self.ordering_field)
+        key_field = queryset.model._meta.get_field(self.key_field)
+        try:
+            value, key = ordering_field.to_python(cursor["v"]), key_field.to_python(cursor["id"])
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        lookup = LessThan if descending else GreaterThan
+        if ordering_field == key_field:
+            return lookup(F(self.key_field), Value(key, output_field=key_field))
+        return lookup(
+            RowValue(F("_keyset"), F(self.key_field)),
+            RowValue(Value(value, output_field=ordering_field), Value(key, output_field=key_field)),
+        )
+
+    def get_count(self, queryset, request):
+        count = request.query_params.get(self.count_query_param)
+        if count == "exact":
+            return queryset.count()
+        if count == "estimate":
+            return get_estimated_count(queryset)
+        return None
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            return {"v": cursor["v"], "id": cursor["id"], "r": bool(cursor.get("r"))}
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        cursor = {"v": force_str(instance._keyset), "id": force_str(getattr(instance, self.key_field))}
+        if reverse:
+            cursor["r"] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, "coreapi must be installed to use `get_schema_fields()`"
+        assert coreschema is not None, "coreschema must be installed to use `get_schema_fields()`"
+        return [
+            coreapi.Field(
+                name=name,
+                required=False,
+                location="query",
+                schema=schema(title=name.capitalize(), description=description),
+            )
+            for name, schema, description in (
+                (self.cursor_query_param, coreschema.String, self.cursor_query_description),
+                (self.limit_query_param, coreschema.Integer, self.limit_query_description),
+                (self.count_query_param, coreschema.String, self.count_query_description),
+            )
+        ]
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.contrib.auth import authenticate
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 
 from user.backends import validate_token, validate_password
 from user.constants import ErrorMessages, MIN_PASSWORD_LENGTH
-from user.models import User
+from user.models import RefreshToken, User
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -28,6 +30,7 @@ class LoginSerializer(serializers.Serializer):
     username = serializers.CharField(max_length=255, write_only=True)
     password = serializers.CharField(max_length=128, write_only=True)
     token = serializers.CharField(max_length=255, read_only=True)
+    refresh_token = serializers.CharField(max_length=255, read_only=True)
 
     def create(self, validated_data):
         user = authenticate(
@@ -38,15 +41,43 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError(ErrorMessages.USER_IS_DEACTIVATED)
 
+        user.refresh_token = RefreshToken.objects.issue(user)
         return user
 
     def update(self, instance, validated_data):
         pass
 
 
+class RefreshSerializer(serializers.Serializer):
+    token = serializers.CharField(max_length=255, read_only=True)
+    refresh_token = serializers.CharField(max_length=255)
+
+    def create(self, validated_data):
+        user, refresh_token = RefreshToken.objects.rotate(validated_data["refresh_token"])
+        if not user:
+            raise AuthenticationFailed(ErrorMessages.INVALID_TOKEN)
+        if not user.is_active:
+            raise serializers.ValidationError(ErrorMessages.USER_IS_DEACTIVATED)
+
+        user.refresh_token = refresh_token
+        return user
+
+    def update(self, instance, validated_data):
+        pass
+
+
+class IntrospectionSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(max_length=1000),
+        allow_empty=False,
+        max_length=settings.INTROSPECTION["MAX_TOKENS"],
+        write_only=True,
+    )
+
+
 class PasswordSetupSerializer(serializers.Serializer):
     username = serializers.CharField(max_length=255, read_only=True)
-    token = serializers.CharField(max_length=500, write_only=True)
+    token = serializers.CharField(max_length=1000, write_only=True)
     password = serializers.CharField(
         max_length=128, min_length=MIN_PASSWORD_LENGTH, write_only=True
     )
@@ -57,7 +88,7 @@ class PasswordSetupSerializer(serializers.Serializer):
         )
         if not user:
             raise serializers.ValidationError(ErrorMessages.INVALID_TOKEN)
-        data["user"] = user
+        data["user"] = user.get_user()
         if not validate_password(data["password"]):
             raise serializers.ValidationError(ErrorMessages.WEAK_PASSWORD_SPEC)
         return data
@@ -66,6 +97,7 @@ class PasswordSetupSerializer(serializers.Serializer):
         user = validated_data["user"]
         user.set_password(validated_data["password"])
         user.save()
+        RefreshToken.objects.revoke_user(user)
         return user
 
     def update(self, instance, validated_data):
@@ -97,6 +129,7 @@ class PasswordChangeSerializer(serializers.Serializer):
             raise serializers.ValidationError(ErrorMessages.PASSWORD_IS_WRONG)
         user.set_password(validated_data["password"])
         user.save()
+        RefreshToken.objects.revoke_user(user)
         return user
 
     def create(self, validated_data):
@@ -112,7 +145,7 @@ class ActivationSerializer(serializers.Serializer):
         user, _ = validate_token(token=token, action="activate", invalidate=True)
         if not user:
             raise serializers.ValidationError(ErrorMessages.INVALID_TOKEN)
-        data["user"] = user
+        data["user"] = user.get_user()
         return data
 
     def create(self, validated_data):
@@ -0,0 +1,92 @@
+from typing import Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from user.cache import LRUCache
+
+SNAPSHOT_FIELDS = ("id", "email", "username", "is_active", "is_staff")
+SNAPSHOT_KEY_PREFIX = "user-snapshot"
+
+
+class UserSnapshot:
+    __slots__ = SNAPSHOT_FIELDS + ("_user",)
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, email, username, is_active, is_staff):
+        for field, value in zip(SNAPSHOT_FIELDS, (id, email, username, is_active, is_staff)):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, "_user", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is read-only, use get_user() to modify the user")
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __str__(self):
+        return self.email
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_user(self):
+        if self._user is None:
+            user_model = apps.get_model(settings.AUTH_USER_MODEL)
+            object.__setattr__(self, "_user", user_model.objects.get(pk=self.id))
+        return self._user
+
+    def as_tuple(self) -> tuple:
+        return tuple(getattr(self, field) for field in SNAPSHOT_FIELDS)
+
+
+local_snapshots = LRUCache(
+    max_size=settings.USER_SNAPSHOT_CACHE["MAX_SIZE"],
+    ttl=settings.USER_SNAPSHOT_CACHE["LOCAL_TTL"],
+)
+
+
+def get_snapshot_key(pk) -> str:
+    return f"{SNAPSHOT_KEY_PREFIX}:{pk}"
+
+
+def get_user_snapshot(pk) -> UserSnapshot:
+    key = get_snapshot_key(pk)
+    values = local_snapshots.get(key)
+
+    if values is None:
+        values = cache.get(key)
+
+        if values is None:
+            user_model = apps.get_model(settings.AUTH_USER_MODEL)
+            values = user_model.objects.filter(pk=pk).values_list(*SNAPSHOT_FIELDS).first()
+            if values is None:
+                raise user_model.DoesNotExist
+            cache.set(key, values, settings.USER_SNAPSHOT_CACHE["TTL"])
+
+        local_snapshots.set(key, values)
+
+    return UserSnapshot(*values)
+
+
+def get_local_user_snapshot(pk) -> Optional[UserSnapshot]:
+    values = local_snapshots.get(get_snapshot_key(pk))
+    return None if values is None else UserSnapshot(*values)
+
+
+def invalidate_user_snapshot(pk):
+    key = get_snapshot_key(pk)
+    cache.delete(key)
+    local_snapshots.delete(key)
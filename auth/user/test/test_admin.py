@@ -1,8 +1,16 @@
+import csv
+import io
+import uuid
+from unittest import skipUnless
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from openpyxl import load_workbook
 from rest_framework import status
 
-from .test_user import UserGetTestCase
-from .utils import BaseAPITestCase
+from .test_user import API_DETAIL, UserGetTestCase
+from .utils import BaseAPITestCase, TestUser
 from ..constants import ErrorMessages
 from ..models import User
 
@@ -18,6 +26,40 @@ class AdminListingTestCase(BaseAPITestCase):
         self.assertIsInstance(response.data.get("results"), list)
         self.assertEqual(len(response.data.get("results")), User.objects.count())
 
+    def test_keyset_pagination(self):
+        for i in range(7):
+            User.objects.create(username=f"keyset_{i}", email=f"keyset_{i}@example.com", first_name=None)
+        for ordering in ("username", "-email", "first_name", "-last_name", None):
+            url = self.url + "?limit=3" + (f"&ordering={ordering}" if ordering else "")
+            pages, links = [], []
+            while url:
+                response = self.admin.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn("count", response.data)
+                pages.append([user["id"] for user in response.data["results"]])
+                url = response.data["next"]
+                links.append(url)
+
+            ids = [user_id for page in pages for user_id in page]
+            self.assertEqual(len(ids), User.objects.count())
+            self.assertEqual(len(set(ids)), len(ids))
+
+            response = self.admin.get(links[0])
+            self.assertEqual([user["id"] for user in response.data["results"]], pages[1])
+            response = self.admin.get(response.data["previous"])
+            self.assertEqual([user["id"] for user in response.data["results"]], pages[0])
+            self.assertIsNone(response.data["previous"])
+
+    def test_keyset_pagination_count(self):
+        response = self.admin.get(self.url + "?count=exact")
+        self.assertEqual(response.data["count"], User.objects.count())
+        response = self.admin.get(self.url + "?count=estimate")
+        self.assertIsInstance(response.data["count"], int)
+
+    def test_keyset_pagination_invalid_cursor(self):
+        response = self.admin.get(self.url + "?cursor=invalid")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_listing_non_auth(self):
         response = self.admin.get_non_auth(self.url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -29,6 +71,75 @@ class AdminListingTestCase(BaseAPITestCase):
         self.assertEqual(response.data.get("detail"), ErrorMessages.NO_PERMISSION)
 
 
+def get_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from get_nodes(child)
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans are checked on postgres only")
+class AdminListingQueryPlanTestCase(BaseAPITestCase):
+    url = reverse(API_ADMIN + "-list")
+
+    def test_keyset_pagination_uses_indexes(self):
+        User.objects.bulk_create(
+            User(
+                username=f"keyset_{i:05}",
+                email=f"keyset_{i:05}@example.com",
+                first_name=None if i % 10 == 0 else f"first_{i % 500:03}",
+                last_name=f"last_{i % 700:03}",
+                password=str(uuid.uuid4()),
+            )
+            for i in range(20_000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE user_user")
+
+        for ordering in ("first_name", "-first_name", "last_name", "-last_name", "username", "-email"):
+            response = self.admin.get(f"{self.url}?limit=20&ordering={ordering}")
+            # the page after the cursor must seek the index instead of scanning past the earlier pages
+            with CaptureQueriesContext(connection) as queries:
+                self.admin.get(response.data["next"])
+            statements = [query["sql"] for query in queries.captured_queries if "LIMIT" in query["sql"]]
+            self.assertEqual(len(statements), 1)
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {statements[0]}")
+                plan = cursor.fetchone()[0]
+            nodes = list(get_nodes(plan[0]["Plan"]))
+            node_types = [node["Node Type"] for node in nodes]
+            self.assertNotIn("Seq Scan", node_types, f"{ordering}: {node_types}")
+            # an OR of comparisons only filters the scanned rows, the row value comparison bounds the scan
+            scans = [node for node in nodes if node["Node Type"] in ("Index Scan", "Index Only Scan")]
+            self.assertTrue(scans, f"{ordering}: {node_types}")
+            self.assertTrue(all("Index Cond" in node for node in scans), f"{ordering}: {scans}")
+
+
+class AdminExportTestCase(BaseAPITestCase):
+    url = reverse(API_ADMIN + "-list")
+    fields = ["id", "email", "username", "first_name", "last_name", "is_active", "is_staff"]
+
+    def test_export_csv(self):
+        response = self.admin.get(self.url + "?format=csv&ordering=email")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], self.fields)
+        self.assertEqual(len(rows), User.objects.count() + 1)
+        self.assertEqual([row[1] for row in rows[1:]], sorted(User.objects.values_list("email", flat=True)))
+
+    def test_export_xlsx(self):
+        response = self.admin.get(self.url + "?format=xlsx")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sheet = load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(list(rows[0]), self.fields)
+        self.assertEqual(len(rows), User.objects.count() + 1)
+
+    def test_export_non_admin(self):
+        response = self.user.get(self.url + "?format=csv")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class AdminGetTestCase(UserGetTestCase):
     @classmethod
     def setUpClass(cls):
@@ -65,3 +176,23 @@ class AdminUpdateTestCase(BaseAPITestCase):
         response = self.user.put(self.get_detail_url(), data={"username": "username"})
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(response.data.get("detail"), ErrorMessages.NO_PERMISSION)
+
+
+class AdminDeleteTestCase(BaseAPITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.api_detail = API_ADMIN + "-detail"
+
+    def test_delete_deactivates_user(self):
+        deleted_user = TestUser()
+        response = deleted_user.get(reverse(API_DETAIL, kwargs={"pk": "me"}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.admin.delete(self.get_detail_url(deleted_user.user_id), data=None)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(deleted_user.get_user().is_active)
+
+        response = deleted_user.get(reverse(API_DETAIL, kwargs={"pk": "me"}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("detail"), ErrorMessages.USER_IS_DEACTIVATED)
@@ -1,7 +1,9 @@
+import threading
 import time
 import uuid
 from unittest.mock import patch
 
+from django.conf import settings
 from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
@@ -10,7 +12,8 @@ from user.test.factory import UserFactory
 from user.test.test_user import API_DETAIL
 from user.test.utils import BaseAPITestCase
 from user.constants import ErrorMessages, MIN_PASSWORD_LENGTH
-from user.models import User, generate_token_by_pk
+from user.hashing import hashing_pool
+from user.models import RefreshToken, User, generate_token_by_pk
 
 API_AUTH = "api:auth"
 
@@ -36,7 +39,8 @@ class UserSignupTestCase(BaseAPITestCase):
         self.assertTrue(user.exists())
         self.assertTrue(not user.get().is_active)
 
-    def test_signup_send_email(self):
+    @patch("user.models.generate_jti", return_value="jti")
+    def test_signup_send_email(self, _):
         new_user = UserFactory.build()
         with patch("user.message_sender.EmailSender._send_email") as mock:
             self.user.post_non_auth(
@@ -176,6 +180,30 @@ class UserLoginTestCase(BaseAPITestCase):
         )
 
 
+class UserLoginBusyTestCase(BaseAPITestCase):
+    url = reverse(API_AUTH + "-login")
+
+    def login(self):
+        return self.user.post_non_auth(
+            self.url,
+            data={"username": self.user.get_user().email, "password": self.user.user_password},
+        )
+
+    def test_login_server_timing(self):
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn("hash;dur=", response["Server-Timing"])
+
+    def test_login_hashing_queue_full(self):
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with patch.object(hashing_pool, "_slots", slots):
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], str(hashing_pool.retry_after))
+        self.assertEqual(response.data.get("detail"), ErrorMessages.SERVICE_BUSY)
+
+
 class UserLogoutTestCase(BaseAPITestCase):
     url = reverse(API_AUTH + "-logout")
 
@@ -216,6 +244,151 @@ class UserLogoutTestCase(BaseAPITestCase):
         self.assertEqual(response.data.get("detail"), ErrorMessages.INVALID_TOKEN_USER)
 
 
+class UserRefreshTestCase(BaseAPITestCase):
+    url = reverse(API_AUTH + "-refresh")
+
+    def login(self):
+        existing_user = self.user.get_user()
+        response = self.user.post_non_auth(
+            reverse(API_AUTH + "-login"),
+            data={"username": existing_user.email, "password": self.user.user_password},
+        )
+        return response.data["refresh_token"]
+
+    def refresh(self, refresh_token):
+        return self.user.post_non_auth(self.url, data={"refresh_token": refresh_token})
+
+    def test_refresh(self):
+        refresh_token = self.login()
+        with patch("django.contrib.auth.hashers.PBKDF2PasswordHasher.encode") as encode:
+            response = self.refresh(refresh_token)
+        encode.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data["refresh_token"], refresh_token)
+
+        self.user.set_auth_token(response.data["token"])
+        response = self.user.get(reverse(API_DETAIL, kwargs={"pk": "me"}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_invalid(self):
+        response = self.refresh("invalid")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("detail"), ErrorMessages.INVALID_TOKEN)
+
+    @override_settings(REFRESH_TOKEN_REUSE_GRACE=0)
+    def test_refresh_reuse_revokes_family(self):
+        refresh_token = self.login()
+        rotated_token = self.refresh(refresh_token).data["refresh_token"]
+
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.refresh(rotated_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh_deactivated(self):
+        refresh_token = self.login()
+        User.objects.filter(pk=self.user.user_id).update(is_active=False)
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data.get("errors")[0], ErrorMessages.USER_IS_DEACTIVATED)
+
+    def test_refresh_retry_within_grace_period(self):
+        refresh_token = self.login()
+        lost_token = self.refresh(refresh_token).data["refresh_token"]
+
+        # the response carrying lost_token never reached the client, which sends refresh_token again
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.refresh(lost_token).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.refresh(response.data["refresh_token"]).status_code, status.HTTP_201_CREATED)
+
+    def test_refresh_replay_after_successor_used_revokes_family(self):
+        refresh_token = self.login()
+        rotated_token = self.refresh(refresh_token).data["refresh_token"]
+        latest_token = self.refresh(rotated_token).data["refresh_token"]
+
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.refresh(latest_token).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_revokes_refresh_token(self):
+        refresh_token = self.login()
+        self.user.post(reverse(API_AUTH + "-logout"), data={"refresh_token": refresh_token})
+        self.user.set_auth_token(self.user.get_user().token)
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_keeps_refresh_token_of_other_user(self):
+        other_user = UserFactory.create(is_active=True)
+        refresh_token = RefreshToken.objects.issue(other_user)
+        self.user.post(reverse(API_AUTH + "-logout"), data={"refresh_token": refresh_token})
+        self.user.set_auth_token(self.user.get_user().token)
+        self.assertEqual(self.refresh(refresh_token).status_code, status.HTTP_201_CREATED)
+
+    @override_settings(TOKEN_EXPIRES={"login": 60, "refresh": -1})
+    def test_purge_expired(self):
+        RefreshToken.objects.issue(self.user.get_user())
+        self.assertEqual(RefreshToken.objects.purge_expired(), 1)
+
+
+class UserIntrospectTestCase(BaseAPITestCase):
+    url = reverse(API_AUTH + "-introspect")
+
+    def introspect(self, tokens):
+        return self.client.post(self.url, {"tokens": tokens}, format="json")
+
+    def test_introspect(self):
+        existing_user = self.user.get_user()
+        inactive_user = UserFactory.create(is_active=False)
+        revoked_token = existing_user.token
+        self.user.set_custom_auth_token(revoked_token)
+        self.user.post_custom_auth(reverse(API_AUTH + "-logout"))
+
+        response = self.introspect(
+            [
+                existing_user.token,
+                "invalid",
+                revoked_token,
+                existing_user.generate_token("activate"),
+                generate_token_by_pk(action="login", pk=uuid.uuid4()),
+                inactive_user.token,
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertTrue(results[0]["active"])
+        self.assertEqual(results[0]["id"], str(existing_user.id))
+        self.assertEqual(results[0]["email"], existing_user.email)
+        self.assertEqual(
+            [result.get("error") for result in results[1:]],
+            [
+                ErrorMessages.INVALID_TOKEN,
+                ErrorMessages.INVALID_TOKEN,
+                ErrorMessages.INVALID_TOKEN_ACTION,
+                ErrorMessages.INVALID_TOKEN_USER,
+                ErrorMessages.USER_IS_DEACTIVATED,
+            ],
+        )
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("max-age=", response["Cache-Control"])
+
+    def test_introspect_queries(self):
+        tokens = [UserFactory.create(is_active=True).token for _ in range(5)]
+        with self.assertNumQueries(1):
+            response = self.introspect(tokens)
+        self.assertTrue(all(result["active"] for result in response.data["results"]))
+        with self.assertNumQueries(0):
+            self.introspect(tokens)
+
+    def test_introspect_inactive_not_cached(self):
+        response = self.introspect(["invalid"])
+        self.assertFalse(response.data["results"][0]["active"])
+        self.assertIn("no-store", response["Cache-Control"])
+
+    def test_introspect_validation(self):
+        self.assertEqual(self.introspect([]).status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = ["token"] * (settings.INTROSPECTION["MAX_TOKENS"] + 1)
+        self.assertEqual(self.introspect(too_many).status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class UserResetPasswordTestCase(BaseAPITestCase):
     url = reverse(API_AUTH + "-password-reset")
 
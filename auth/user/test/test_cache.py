@@ -0,0 +1,217 @@
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+import fakeredis
+import jwt
+import redis
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from mentoring.cache import TwoTierCache
+from ..backends import decode_token
+from ..cache import LRUCache, token_cache, token_digest
+from ..models import User, generate_token_by_pk
+from ..snapshots import UserSnapshot, get_user_snapshot
+from .factory import UserFactory
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_get_set(self):
+        lru = LRUCache(max_size=2)
+        lru.set("a", 1)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.stats()["hits"], 1)
+        self.assertEqual(lru.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.stats()["evictions"], 1)
+
+    def test_expires_at(self):
+        lru = LRUCache(max_size=2)
+        lru.set("a", 1, expires_at=time.time() - 1)
+        self.assertIsNone(lru.get("a"))
+
+    def test_ttl_caps_expires_at(self):
+        lru = LRUCache(max_size=2, ttl=0)
+        lru.set("a", 1, expires_at=time.time() + 3_600)
+        self.assertIsNone(lru.get("a"))
+
+
+class TokenCacheTestCase(SimpleTestCase):
+    def test_decode_token_is_cached(self):
+        pk = uuid.uuid4()
+        token = generate_token_by_pk(action="login", pk=pk)
+        with patch("user.tokens.jwt.decode", wraps=jwt.decode) as mock:
+            self.assertEqual(decode_token(token)["id"], str(pk))
+            self.assertEqual(decode_token(token)["id"], str(pk))
+            mock.assert_called_once()
+        self.assertIsNotNone(token_cache.get(token_digest(token)))
+
+    def test_cached_payload_is_not_shared(self):
+        pk = uuid.uuid4()
+        token = generate_token_by_pk(action="login", pk=pk)
+        decode_token(token)["id"] = "changed"
+        self.assertEqual(decode_token(token)["id"], str(pk))
+
+
+class UserSnapshotTestCase(TestCase):
+    def test_snapshot(self):
+        user = UserFactory.create(is_active=True)
+        snapshot = get_user_snapshot(str(user.pk))
+        self.assertIsInstance(snapshot, UserSnapshot)
+        self.assertEqual(snapshot.as_tuple(), (user.id, user.email, user.username, True, False))
+        with self.assertNumQueries(0):
+            get_user_snapshot(str(user.pk))
+
+    def test_snapshot_is_read_only(self):
+        user = UserFactory.create()
+        snapshot = get_user_snapshot(user.pk)
+        with self.assertRaises(AttributeError):
+            snapshot.is_active = True
+
+    def test_snapshot_loads_user_lazily(self):
+        user = UserFactory.create()
+        snapshot = get_user_snapshot(user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(snapshot.first_name, user.first_name)
+            self.assertEqual(snapshot.get_user(), user)
+
+    def test_snapshot_invalidated_on_save(self):
+        user = UserFactory.create(is_active=True)
+        get_user_snapshot(user.pk)
+        user.is_active = False
+        user.save()
+        self.assertFalse(get_user_snapshot(user.pk).is_active)
+
+    def test_snapshot_not_found(self):
+        with self.assertRaises(User.DoesNotExist):
+            get_user_snapshot(uuid.uuid4())
+
+
+class TwoTierCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+
+        class FakeConnectionPool(redis.ConnectionPool):
+            @classmethod
+            def from_url(cls, url, **kwargs):
+                return cls(connection_class=fakeredis.FakeConnection, server=server)
+
+        self.options = {"LOCAL_TTL": 60, "RECONNECT_INTERVAL": 0.01, "pool_class": FakeConnectionPool}
+        # the local tier is shared per process by location, every test and worker gets its own
+        self.location = f"redis://{uuid.uuid4().hex}"
+
+    def get_cache(self, location=None) -> TwoTierCache:
+        cache = TwoTierCache(location or self.location, {"OPTIONS": self.options})
+        cache.get("warmup")
+        self.wait_for(lambda: cache.stats()["subscribed"])
+        return cache
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_local_tier(self):
+        cache = self.get_cache()
+        cache.set("key", {"value": 1})
+        self.assertEqual(cache.get("key"), {"value": 1})
+        self.assertEqual(cache.get("key"), {"value": 1})
+        self.assertEqual(cache.get_many(["key", "missing"]), {"key": {"value": 1}})
+
+        stats = cache.stats()
+        self.assertEqual(stats["redis"]["hits"], 1)
+        self.assertEqual(stats["local"]["hits"], 2)
+        # local entries are stored serialized, callers never share an instance
+        self.assertIsNot(cache.get("key"), cache.get("key"))
+
+    def test_invalidation_between_workers(self):
+        worker, other_worker = self.get_cache(), self.get_cache(f"redis://{uuid.uuid4().hex}")
+        worker.set("key", 1)
+        self.wait_for(lambda: other_worker.stats()["invalidations"] == 1)
+        self.assertEqual(other_worker.get("key"), 1)
+        self.assertEqual(other_worker.get("key"), 1)
+        self.assertEqual(other_worker.stats()["local"]["hits"], 1)
+
+        worker.set("key", 2)
+        self.wait_for(lambda: other_worker.stats()["invalidations"] == 2)
+        self.assertEqual(other_worker.get("key"), 2)
+
+        worker.delete("key")
+        self.wait_for(lambda: other_worker.stats()["invalidations"] == 3)
+        self.assertIsNone(other_worker.get("key"))
+
+    def test_single_flight(self):
+        cache = self.get_cache()
+        cache.set("key", 1)
+        client = cache._cache.get_client("key")
+        fetches = []
+
+        def slow_get(key):
+            fetches.append(key)
+            time.sleep(0.1)
+            return b"1"
+
+        with patch.object(cache._cache, "get_client", return_value=client), patch.object(client, "get", slow_get):
+            threads = [threading.Thread(target=cache.get, args=("key",)) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(cache.stats()["coalesced"], 9)
+
+    def test_bypass_local_tier_while_unsubscribed(self):
+        cache = self.get_cache()
+        cache.set("key", 1)
+        cache.get("key")
+        cache._tier.subscribed = False
+        cache.get("key")
+        self.assertEqual(cache.stats()["redis"]["hits"], 2)
+
+    def test_local_tier_shared_between_threads(self):
+        cache = self.get_cache()
+        self.assertIs(TwoTierCache(self.location, {"OPTIONS": self.options})._tier, cache._tier)
+        cache.set("key", 1)
+        cache_settings = {
+            "default": {"BACKEND": "mentoring.cache.TwoTierCache", "LOCATION": self.location, "OPTIONS": self.options}
+        }
+        listeners = [thread for thread in threading.enumerate() if thread.name == "cache-invalidation"]
+        fetches = []
+        original_get = redis.Redis.get
+
+        def slow_get(client, key):
+            fetches.append(key)
+            time.sleep(0.1)
+            return original_get(client, key)
+
+        values = []
+        # django builds a backend instance per thread, the requests below still share one redis round trip
+        with override_settings(CACHES=cache_settings), patch.object(redis.Redis, "get", slow_get):
+            threads = [threading.Thread(target=lambda: values.append(caches["default"].get("key"))) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(values, [1] * 10)
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(cache.stats()["coalesced"], 9)
+        self.assertEqual(cache.get("key"), 1)
+        self.assertEqual(cache.stats()["local"]["hits"], 1)
+        self.assertEqual(
+            [thread for thread in threading.enumerate() if thread.name == "cache-invalidation"], listeners
+        )
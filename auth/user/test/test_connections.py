@@ -0,0 +1,40 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from mentoring.connections import ConnectionMetricsMiddleware, ConnectionMetricsMixin, connection_stats
+
+
+class FakeDatabaseWrapper:
+    alias = "default"
+
+    def get_new_connection(self, conn_params):
+        return object()
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, FakeDatabaseWrapper):
+    pass
+
+
+class ConnectionMetricsTestCase(SimpleTestCase):
+    def get_response(self, connect: bool):
+        def view(request):
+            if connect:
+                DatabaseWrapper().get_new_connection({})
+            response = HttpResponse()
+            response["Server-Timing"] = "hash;dur=1.0"
+            return response
+
+        return ConnectionMetricsMiddleware(view)(RequestFactory().get("/"))
+
+    def test_new_connection(self):
+        stats = connection_stats.stats()
+        response = self.get_response(connect=True)
+        self.assertIn("hash;dur=1.0, db-connect;dur=", response["Server-Timing"])
+        self.assertEqual(connection_stats.stats()["opened"], stats["opened"] + 1)
+        self.assertEqual(connection_stats.stats()["requests"], stats["requests"] + 1)
+
+    def test_reused_connection(self):
+        stats = connection_stats.stats()
+        response = self.get_response(connect=False)
+        self.assertEqual(response["Server-Timing"], "hash;dur=1.0")
+        self.assertEqual(connection_stats.stats()["opened"], stats["opened"])
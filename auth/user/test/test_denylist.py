@@ -0,0 +1,126 @@
+import json
+import time
+import uuid
+from unittest.mock import patch
+
+import fakeredis
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework.exceptions import AuthenticationFailed
+
+from ..backends import decode_token, validate_token
+from ..constants import ErrorMessages
+from ..denylist import (
+    FLOOR_KEY,
+    SEQUENCE_KEY,
+    BloomFilter,
+    RevocationFeed,
+    TokenDenylist,
+    generate_jti,
+    token_denylist,
+)
+from ..models import generate_token_by_pk
+
+
+class BloomFilterTestCase(SimpleTestCase):
+    def test_contains(self):
+        bloom_filter = BloomFilter(capacity=1_000, error_rate=0.001)
+        items = [generate_jti() for _ in range(1_000)]
+        for item in items:
+            bloom_filter.add(item)
+        self.assertTrue(all(item in bloom_filter for item in items))
+        false_positives = sum(generate_jti() in bloom_filter for _ in range(1_000))
+        self.assertLess(false_positives, 10)
+
+    def test_saturated(self):
+        bloom_filter = BloomFilter(capacity=1, error_rate=0.01)
+        bloom_filter.add("a")
+        self.assertFalse(bloom_filter.is_saturated)
+        bloom_filter.add("b")
+        self.assertTrue(bloom_filter.is_saturated)
+
+
+class TokenDenylistTestCase(SimpleTestCase):
+    def test_token_has_jti(self):
+        token = generate_token_by_pk(action="login", pk=uuid.uuid4())
+        self.assertTrue(decode_token(token)["jti"])
+
+    def test_revoke(self):
+        jti = generate_jti()
+        self.assertFalse(token_denylist.is_revoked(jti))
+        token_denylist.revoke(jti, int(time.time()) + 60)
+        self.assertTrue(token_denylist.is_revoked(jti))
+
+    def test_sync_from_other_worker(self):
+        worker = TokenDenylist(capacity=100, error_rate=0.001, sync_interval=60)
+        worker.sync(force=True)
+        jti = generate_jti()
+        token_denylist.revoke(jti, int(time.time()) + 60)
+        self.assertFalse(worker.is_revoked(jti))
+        worker.sync(force=True)
+        self.assertTrue(worker.is_revoked(jti))
+
+    def test_strict_skips_filter(self):
+        worker = TokenDenylist(capacity=100, error_rate=0.001, sync_interval=60)
+        worker.sync(force=True)
+        jti = generate_jti()
+        token_denylist.revoke(jti, int(time.time()) + 60)
+        self.assertFalse(worker.is_revoked(jti))
+        self.assertTrue(worker.is_revoked(jti, strict=True))
+
+    def test_single_use_token_consumed_by_other_worker(self):
+        token = generate_token_by_pk(action="activate", pk=uuid.uuid4())
+        # another worker revoked it, this worker's filter has not synced yet
+        cache.set(token_denylist.get_key(decode_token(token)["jti"]), 1, 60)
+        with self.assertRaisesMessage(AuthenticationFailed, ErrorMessages.INVALID_TOKEN):
+            validate_token(token, action="activate", invalidate=True)
+
+    def test_rebuild_on_start(self):
+        jti = generate_jti()
+        token_denylist.revoke(jti, int(time.time()) + 60)
+        worker = TokenDenylist(capacity=100, error_rate=0.001, sync_interval=60)
+        self.assertTrue(worker.is_revoked(jti))
+
+    def test_rebuild_skips_expired_entries(self):
+        cache.clear()
+        expired = [generate_jti() for _ in range(3)]
+        for jti in expired:
+            token_denylist.revoke(jti, int(time.time()) + 60)
+        jti = generate_jti()
+        token_denylist.revoke(jti, int(time.time()) + 60)
+        seq = cache.get(SEQUENCE_KEY)
+        cache.delete_many([token_denylist.get_entry_key(entry) for entry in range(seq - 3, seq)])
+
+        TokenDenylist(capacity=100, error_rate=0.001, sync_interval=60).sync(force=True)
+        self.assertEqual(cache.get(FLOOR_KEY), seq - 1)
+        # a worker started later only reads the entries above the floor
+        worker = TokenDenylist(capacity=100, error_rate=0.001, sync_interval=60)
+        with patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            worker.sync(force=True)
+        self.assertEqual(get_many.call_args.args[0], [token_denylist.get_entry_key(seq)])
+        self.assertTrue(worker.is_revoked(jti))
+
+
+class RevocationFeedTestCase(SimpleTestCase):
+    def test_publish(self):
+        feed = RevocationFeed(url="redis://localhost", key="revocations", channel="revocations", enabled=True)
+        feed._client = fakeredis.FakeRedis()
+        pubsub = feed._client.pubsub()
+        pubsub.subscribe(feed.channel)
+        self.assertEqual(pubsub.get_message(timeout=1)["type"], "subscribe")
+
+        expires_at = int(time.time()) + 60
+        feed.publish("revoked", expires_at)
+        feed._client.zadd(feed.key, {"expired": time.time() - 60})
+        feed.publish("other", expires_at)
+
+        self.assertEqual(json.loads(pubsub.get_message(timeout=1)["data"]), {"jti": "revoked", "exp": expires_at})
+        self.assertEqual(feed._client.zrange(feed.key, 0, -1), [b"other", b"revoked"])
+
+    def test_publish_redis_down(self):
+        feed = RevocationFeed(url="redis://localhost", key="revocations", channel="revocations", enabled=True)
+        server = fakeredis.FakeServer()
+        server.connected = False
+        feed._client = fakeredis.FakeRedis(server=server)
+        with self.assertLogs("user.denylist", level="ERROR"):
+            feed.publish("revoked", int(time.time()) + 60)
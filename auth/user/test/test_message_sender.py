@@ -0,0 +1,78 @@
+from smtplib import SMTPException
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from ..message_sender import EmailQueueWorker, Message, QueuedEmailSender
+from ..models import OutboundMessage
+from .factory import UserFactory
+
+
+class QueuedEmailSenderTestCase(TestCase):
+    message = Message(subject="subject", body="body")
+
+    def setUp(self):
+        self.user = UserFactory.build()
+        self.sender = QueuedEmailSender()
+        self.worker = EmailQueueWorker(batch_size=2, max_attempts=2, retry_backoff=30, poll_interval=1)
+
+    def test_send_message_is_queued(self):
+        self.sender.send_message(self.user, self.message)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundMessage.objects.get()
+        self.assertEqual(queued.recipient, self.user.email)
+        self.assertEqual(queued.status, OutboundMessage.Status.PENDING)
+
+    def test_drain(self):
+        for _ in range(3):
+            self.sender.send_message(self.user, self.message)
+        with patch("user.message_sender.get_connection", wraps=get_connection) as mock:
+            self.assertEqual(self.worker.drain(), 3)
+            self.assertEqual(mock.call_count, 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(mail.outbox[0].subject, self.message.subject)
+        self.assertFalse(OutboundMessage.objects.exclude(status=OutboundMessage.Status.SENT).exists())
+
+    def test_retry_with_backoff(self):
+        self.sender.send_message(self.user, self.message)
+        with patch("user.message_sender.EmailMessage.send", side_effect=SMTPException("down")):
+            self.worker.drain()
+        queued = OutboundMessage.objects.get()
+        self.assertEqual(queued.status, OutboundMessage.Status.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+        self.assertIn("down", queued.last_error)
+
+        self.assertEqual(self.worker.drain(), 0)
+        OutboundMessage.objects.update(next_attempt_at=timezone.now())
+        with patch("user.message_sender.EmailMessage.send", side_effect=SMTPException("down")):
+            self.worker.drain()
+        self.assertEqual(OutboundMessage.objects.get().status, OutboundMessage.Status.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class EmailQueueWorkerTestCase(TransactionTestCase):
+    message = Message(subject="subject", body="body")
+
+    def setUp(self):
+        self.user = UserFactory.build()
+        self.worker = EmailQueueWorker(batch_size=2, max_attempts=2, retry_backoff=30, poll_interval=1)
+
+    def test_send_outside_transaction(self):
+        QueuedEmailSender().send_message(self.user, self.message)
+
+        def send(*args, **kwargs):
+            self.assertFalse(connection.in_atomic_block)
+            # the claim is committed, other workers skip the message while it is being sent
+            self.assertFalse(OutboundMessage.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+            return 1
+
+        with patch("user.message_sender.EmailMessage.send", side_effect=send) as mock:
+            self.assertEqual(self.worker.drain(), 1)
+            self.assertEqual(mock.call_count, 1)
+        self.assertEqual(OutboundMessage.objects.get().status, OutboundMessage.Status.SENT)
@@ -0,0 +1,117 @@
+import json
+import uuid
+from wsgiref.util import setup_testing_defaults
+
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase
+
+from mentoring.asgi import application
+from mentoring.wsgi import application as wsgi_application
+from ..backends import decode_token
+from ..constants import ErrorMessages
+from ..denylist import revoke_token
+from ..models import generate_token_by_pk
+from ..verification import verify_locally
+from .factory import UserFactory
+
+
+class VerifyEndpointTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = UserFactory.create(is_active=True)
+        self.token = self.user.token
+
+    async def verify(self, token=None, method="GET"):
+        headers = [(b"authorization", f"Token {token}".encode("ascii"))] if token else []
+        communicator = ApplicationCommunicator(
+            application, {"type": "http", "method": method, "path": "/api/auth/verify/", "headers": headers}
+        )
+        await communicator.send_input({"type": "http.request"})
+        start = await communicator.receive_output()
+        body = await communicator.receive_output()
+        return start["status"], json.loads(body["body"])
+
+    async def test_verify(self):
+        status, data = await self.verify(self.token)
+        self.assertEqual(status, 200)
+        self.assertEqual(data["id"], str(self.user.id))
+        self.assertEqual(data["email"], self.user.email)
+        self.assertFalse(data["is_staff"])
+
+    async def test_verify_from_local_caches(self):
+        self.assertIsNone(verify_locally(self.token))
+        await self.verify(self.token)
+        self.assertEqual(verify_locally(self.token)["id"], str(self.user.id))
+
+    async def test_not_authenticated(self):
+        status, data = await self.verify()
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.NOT_AUTHENTICATED)
+
+    async def test_invalid_token(self):
+        status, data = await self.verify("invalid")
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.INVALID_TOKEN)
+
+    async def test_wrong_action(self):
+        status, data = await self.verify(generate_token_by_pk(action="activate", pk=self.user.id))
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.INVALID_TOKEN_ACTION)
+
+    async def test_unknown_user(self):
+        status, data = await self.verify(generate_token_by_pk(action="login", pk=uuid.uuid4()))
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.INVALID_TOKEN_USER)
+
+    async def test_revoked_token(self):
+        self.assertEqual((await self.verify(self.token))[0], 200)
+        revoke_token(self.token, decode_token(self.token))
+        status, data = await self.verify(self.token)
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.INVALID_TOKEN)
+
+    async def test_method_not_allowed(self):
+        status, _ = await self.verify(self.token, method="DELETE")
+        self.assertEqual(status, 405)
+
+
+class WSGIVerifyEndpointTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = UserFactory.create(is_active=True)
+        self.token = self.user.token
+
+    def verify(self, token=None, method="GET"):
+        environ = {"REQUEST_METHOD": method, "PATH_INFO": "/api/auth/verify/"}
+        if token:
+            environ["HTTP_AUTHORIZATION"] = f"Token {token}"
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = int(status.split()[0])
+            response["headers"] = dict(headers)
+
+        body = b"".join(wsgi_application(environ, start_response))
+        self.assertEqual(response["headers"]["cache-control"], "no-store")
+        return response["status"], json.loads(body)
+
+    def test_verify(self):
+        status, data = self.verify(self.token)
+        self.assertEqual(status, 200)
+        self.assertEqual(data["id"], str(self.user.id))
+        self.assertEqual(data["email"], self.user.email)
+
+    def test_not_authenticated(self):
+        status, data = self.verify()
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.NOT_AUTHENTICATED)
+
+    def test_revoked_token(self):
+        self.assertEqual(self.verify(self.token)[0], 200)
+        revoke_token(self.token, decode_token(self.token))
+        status, data = self.verify(self.token)
+        self.assertEqual(status, 401)
+        self.assertEqual(data["detail"], ErrorMessages.INVALID_TOKEN)
+
+    def test_method_not_allowed(self):
+        status, _ = self.verify(self.token, method="DELETE")
+        self.assertEqual(status, 405)
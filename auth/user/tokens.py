@@ -0,0 +1,39 @@
+import jwt
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from jwt.exceptions import InvalidAlgorithmError, InvalidSignatureError
+
+from user.keyring import KeyRing
+
+SUPPORTED_ALGORITHMS = ("RS256", "PS256", "ES256", "EdDSA")
+
+if settings.JWT_ALGORITHM not in SUPPORTED_ALGORITHMS:
+    raise ImproperlyConfigured(f"JWT_ALGORITHM must be one of {', '.join(SUPPORTED_ALGORITHMS)}")
+
+keyring = KeyRing.from_settings()
+
+
+def encode_token(payload: dict) -> str:
+    signing_key = keyring.get_signing_key()
+    return jwt.encode(
+        payload,
+        signing_key.key,
+        algorithm=signing_key.algorithm,
+        headers={"kid": signing_key.kid},
+    )
+
+
+def verify_token(token: str) -> dict:
+    kid = jwt.get_unverified_header(token).get("kid", settings.JWT_LEGACY_KEY_ID)
+    keys = keyring.get_verification_keys(kid)
+    if not keys:
+        raise jwt.InvalidTokenError(f"Unknown key id {kid}")
+
+    # a kid has several keys only while a rotated key is in its grace period
+    for key in keys[:-1]:
+        try:
+            return jwt.decode(token, key.key, algorithms=[key.algorithm])
+        except (InvalidAlgorithmError, InvalidSignatureError):
+            continue
+    return jwt.decode(token, keys[-1].key, algorithms=[keys[-1].algorithm])
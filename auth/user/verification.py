@@ -0,0 +1,113 @@
+import json
+from http import HTTPStatus
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from user.backends import JWTAuthentication, decode_token
+from user.constants import ErrorMessages
+from user.denylist import token_denylist
+from user.introspection import PRINCIPAL_FIELDS, introspect, introspect_tokens
+from user.snapshots import get_local_user_snapshot
+
+VERIFY_PATH = "/api/auth/verify"
+ALLOWED_METHODS = ("GET", "POST")
+AUTH_PREFIX = JWTAuthentication.authentication_header_prefix.lower().encode("ascii")
+
+
+def parse_authorization(value: bytes) -> Optional[str]:
+    parts = value.split()
+    if len(parts) == 2 and parts[0].lower() == AUTH_PREFIX:
+        return parts[1].decode("latin-1")
+    return None
+
+
+def get_scope_token(scope: dict) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return parse_authorization(value)
+    return None
+
+
+def check_request(method: str, token: Optional[str]) -> Optional[tuple]:
+    if method not in ALLOWED_METHODS:
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"detail": ErrorMessages.NOT_ALLOWED}
+    if token is None:
+        return HTTPStatus.UNAUTHORIZED, {"detail": ErrorMessages.NOT_AUTHENTICATED}
+    return None
+
+
+def get_result_response(result: dict) -> tuple:
+    if not result["active"]:
+        return HTTPStatus.UNAUTHORIZED, {"detail": result["error"]}
+    return HTTPStatus.OK, {field: result[field] for field in PRINCIPAL_FIELDS}
+
+
+def get_response_headers(body: bytes) -> list:
+    return [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("ascii")),
+        (b"cache-control", b"no-store"),
+    ]
+
+
+def verify_locally(token: str) -> Optional[dict]:
+    # uses the in-process caches only, returns None when redis or the database has to be asked
+    try:
+        payload = decode_token(token)
+    except Exception:
+        return introspect(payload=None, revoked=False, user=None)
+
+    jti = payload.get("jti")
+    if jti is None or not token_denylist.is_known_not_revoked(jti):
+        return None
+
+    user = None
+    if payload.get("action") == "login":
+        user = get_local_user_snapshot(payload["id"])
+        if user is None:
+            return None
+    return introspect(payload=payload, revoked=False, user=user)
+
+
+def verify_remotely(token: str) -> dict:
+    # runs outside of a django request, so the connections are cleaned up the way request signals do
+    close_old_connections()
+    try:
+        return introspect_tokens([token])[0]
+    finally:
+        close_old_connections()
+
+
+async def verify(token: str) -> dict:
+    result = verify_locally(token)
+    if result is None:
+        result = await sync_to_async(verify_remotely, thread_sensitive=False)(token)
+    return result
+
+
+async def verify_application(scope: dict, receive, send):
+    token = get_scope_token(scope)
+    response = check_request(scope["method"], token)
+    if response is None:
+        response = get_result_response(await verify(token))
+
+    status, data = response
+    body = json.dumps(data).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": get_response_headers(body)})
+    await send({"type": "http.response.body", "body": body})
+
+
+def verify_wsgi_application(environ: dict, start_response):
+    # gthread workers answer from the request thread, its database connection is kept for the next request
+    token = parse_authorization(environ.get("HTTP_AUTHORIZATION", "").encode("latin-1"))
+    response = check_request(environ["REQUEST_METHOD"], token)
+    if response is None:
+        response = get_result_response(verify_locally(token) or verify_remotely(token))
+
+    status, data = response
+    body = json.dumps(data).encode("utf-8")
+    headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in get_response_headers(body)]
+    start_response(f"{status.value} {status.phrase}", headers)
+    return [body]
@@ -1,3 +1,4 @@
+from django.utils.cache import patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_excel.renderers import XLSXRenderer
 from rest_framework import status, filters
@@ -17,15 +18,20 @@ from rest_framework_csv.renderers import CSVRenderer
 from mentoring.serializers import EmptySerializer
 from .backends import validate_token
 from .constants import ErrorMessages
+from .exports import EXPORTERS
+from .introspection import get_cache_ttl, introspect_tokens
 from .message_sender import email_sender
-from .models import User
+from .models import RefreshToken, User
+from .pagination import KeysetPagination
 from .serializers import (
     ActivationSerializer,
     AdminCreateUserSerializer,
     AdminSerializer,
+    IntrospectionSerializer,
     LoginSerializer,
     PasswordChangeSerializer,
     PasswordSetupSerializer,
+    RefreshSerializer,
     RegistrationSerializer,
     UserSerializer,
 )
@@ -42,8 +48,14 @@ class AuthViewSet(CreateModelMixin, GenericViewSet):
     @action(detail=False, methods=["post"])
     def logout(self, request, *args, **kwargs):
         validate_token(token=request.auth, action="login", invalidate=True)
+        if request.data.get("refresh_token"):
+            RefreshToken.objects.revoke(request.data["refresh_token"], user_id=request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=["post"], serializer_class=RefreshSerializer)
+    def refresh(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
+
     @action(detail=False, methods=["post"], serializer_class=RegistrationSerializer)
     def signup(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
@@ -62,6 +74,20 @@ class AuthViewSet(CreateModelMixin, GenericViewSet):
             email_sender.send_message(user, user.get_email_message("PASSWORD_RESET"))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=["post"], serializer_class=IntrospectionSerializer)
+    def introspect(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = introspect_tokens(serializer.validated_data["tokens"])
+        response = Response({"results": results})
+        # only active results may be reused, and never past the earliest expiry in the batch
+        cache_ttl = get_cache_ttl(results)
+        if cache_ttl:
+            patch_cache_control(response, private=True, max_age=cache_ttl)
+        else:
+            patch_cache_control(response, no_store=True)
+        return response
+
     @action(detail=False, methods=["post"], serializer_class=PasswordSetupSerializer)
     def password_setup(self, request, *args, **kwargs):
         return self.create(request, *args, **kwargs)
@@ -78,7 +104,7 @@ class UserViewSet(RetrieveModelMixin, UpdateModelMixin, GenericViewSet):
 
     def get_object(self):
         if self.kwargs.get("pk") == self.current_user:
-            return self.request.user
+            return self.request.user.get_user()
         return super().get_object()
 
     def update(self, request, *args, **kwargs):
@@ -99,12 +125,19 @@ class AdminUserViewSet(ModelViewSet):
     filterset_fields = ["username", "email", "first_name", "last_name"]
     ordering_fields = ["username", "email", "first_name", "last_name"]
     renderer_classes = [JSONRenderer, CSVRenderer, XLSXRenderer]
+    pagination_class = KeysetPagination
+    export_filename = "users"
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
+        export_format = request.query_params.get("format")
+        if export_format in EXPORTERS:
+            fields = list(self.get_serializer_class().Meta.fields)
+            return EXPORTERS[export_format](queryset, fields, filename=self.export_filename)
+
         page = self.paginate_queryset(queryset)
-        if page and request.query_params.get("format") not in ["xlsx", "csv"]:
+        if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
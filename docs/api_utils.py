@@ -1,21 +1,165 @@
+import base64
+import binascii
+import json
+from datetime import datetime
 from urllib import parse
+from uuid import UUID
 
-from flask import request
+from flask import current_app as app, jsonify, request
 from flask_sqlalchemy import BaseQuery
 from pydantic import BaseModel
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from extensions import db
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kwargs):
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kwargs)}"
+
+
+def get_estimated_count(query: BaseQuery) -> int:
+    # the planner row estimate is much cheaper than a COUNT(*) on large tables
+    plan = db.session.execute(Explain(query.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_count(query: BaseQuery, count: str):
+    if count == "exact":
+        return query.count()
+    if count == "estimate":
+        return get_estimated_count(query)
+    return None
+
+
+def encode_cursor(value, key, reverse: bool = False) -> str:
+    cursor = {"v": value.isoformat() if isinstance(value, datetime) else value, "id": str(key)}
+    if reverse:
+        cursor["r"] = 1
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(cursor: str, column) -> dict:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = decoded["v"]
+        if isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, column.type.python_type) or isinstance(value, bool):
+            raise InvalidCursor("Invalid cursor")
+        return {"v": value, "id": UUID(decoded["id"]), "r": bool(decoded.get("r"))}
+    except (TypeError, ValueError, KeyError, AttributeError, binascii.Error):
+        raise InvalidCursor("Invalid cursor")
+
+
+def json_response(data):
+    if orjson is None or app.config["JSONIFY_PRETTYPRINT_REGULAR"] or app.debug:
+        return jsonify(data)
+
+    option = orjson.OPT_APPEND_NEWLINE | (orjson.OPT_SORT_KEYS if app.config["JSON_SORT_KEYS"] else 0)
+    body = orjson.dumps(data, option=option)
+    if app.config["JSON_AS_ASCII"] and not body.isascii():
+        # orjson can't escape non-ASCII characters, keep the output identical to jsonify
+        return jsonify(data)
+    return app.response_class(body, mimetype=app.config["JSONIFY_MIMETYPE"])
+
+
+def get_rows(query: BaseQuery, model, limit: int, offset: int = 0) -> list:
+    # plain tuples of the serialized columns skip building ORM instances
+    columns = [getattr(model, column) for column in model.serialize_columns]
+    return query.with_entities(*columns).limit(limit).offset(offset).all()
+
+
+def get_url(url: str, params: dict):
+    return f"{request.scheme}://{request.host}{url}?{parse.urlencode(params)}"
+
 
 def paginate(query: BaseQuery, url: str, parsed_query: dict) -> dict:
-    count = query.count()
+    if parsed_query["pagination"] == "cursor":
+        return paginate_cursor(query=query, url=url, parsed_query=parsed_query)
+    return paginate_offset(query=query, url=url, parsed_query=parsed_query)
+
+
+def paginate_cursor(query: BaseQuery, url: str, parsed_query: dict) -> dict:
+    limit = parsed_query["limit"]
+    column, key, descending = parsed_query["keyset"]
+    count = get_count(query, parsed_query["count"])
+    cursor = decode_cursor(parsed_query["cursor"], column) if parsed_query["cursor"] else None
+    reverse = bool(cursor and cursor["r"])
+    backwards = descending != reverse
+
+    query = query.order_by(None).order_by(*(i.desc() if backwards else i.asc() for i in (column, key)))
+    if cursor:
+        # a row value comparison lets postgres seek the (column, id) index
+        bound = tuple_(bindparam(None, cursor["v"], type_=column.type), bindparam(None, cursor["id"], type_=key.type))
+        query = query.filter(tuple_(column, key) < bound if backwards else tuple_(column, key) > bound)
+
+    items = get_rows(query, parsed_query["model"], limit + 1)
+    has_more = len(items) > limit
+    items = items[:limit]
+    if reverse:
+        items.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor is not None
+
+    params = {
+        "pagination": "cursor",
+        "limit": limit,
+        **parsed_query["filtering"],
+        **({"order": parsed_query["order"]} if parsed_query["order"] else {}),
+        **({"count": parsed_query["count"]} if parsed_query["count"] else {}),
+    }
+
+    def get_cursor_url(item, reverse: bool = False):
+        cursor = encode_cursor(getattr(item, column.key), getattr(item, key.key), reverse=reverse)
+        return get_url(url, {**params, "cursor": cursor})
+
+    next_link = get_cursor_url(items[-1]) if has_next and items else None
+    previous_link = None
+    if has_previous:
+        # stepping back from past the last row restarts from the first page
+        previous_link = get_cursor_url(items[0], reverse=True) if items else get_url(url, params)
+
+    return {
+        **({"count": count} if count is not None else {}),
+        "next": next_link,
+        "previous": previous_link,
+        "results": [parsed_query["model"].serialize_row(i) for i in items],
+    }
+
+
+def paginate_offset(query: BaseQuery, url: str, parsed_query: dict) -> dict:
+    count = get_count(query, parsed_query["count"] or "exact")
     limit = parsed_query["limit"]
     offset = parsed_query["offset"]
     order = parsed_query["order"]
     other_params = {
         **parsed_query["filtering"],
         **({"order": order} if order else {}),
+        **({"count": parsed_query["count"]} if parsed_query["count"] else {}),
     }
+    items = get_rows(query, parsed_query["model"], limit + 1, offset)
 
     previous_offset = max(0, offset - limit)
     previous_params = {
@@ -29,14 +173,13 @@ def paginate(query: BaseQuery, url: str, parsed_query: dict) -> dict:
         "offset": next_offset,
         "limit": limit,
         **other_params,
-    } if next_offset < count else {}
+    } if len(items) > limit else {}
 
-    full_url = f"{request.scheme}://{request.host}{url}"
     return {
-        "count": count,
-        "next": f"{full_url}?{parse.urlencode(next_params)}" if next_params else None,
-        "previous": f"{full_url}?{parse.urlencode(previous_params)}" if previous_params else None,
-        "results": [i.serialize for i in query.limit(limit).offset(offset).all()],
+        **({"count": count} if count is not None else {}),
+        "next": get_url(url, next_params) if next_params else None,
+        "previous": get_url(url, previous_params) if previous_params else None,
+        "results": [parsed_query["model"].serialize_row(i) for i in items[:limit]],
     }
 
 
@@ -51,11 +194,23 @@ def get_ordering(order_request, ordering_fields: list, model):
     return ordering
 
 
+def get_keyset_ordering(order_request, ordering_fields: list, model) -> tuple:
+    # only the first requested field is used, the primary key breaks ties
+    for term in (order_request or "").split(","):
+        field = term.strip().lstrip("-")
+        if field in ordering_fields:
+            return getattr(model, field), model.id, term.strip().startswith("-")
+    return getattr(model, ordering_fields[0]), model.id, False
+
+
 def parse_query(query: BaseModel, model: db.Model, ordering_fields: list) -> dict:
     query_dict = {key: value for key, value in query.dict().items() if value}
     order_request = query_dict.pop("order", "")
     offset = query_dict.pop("offset", 0)
     limit = query_dict.pop("limit", 10)
+    pagination = query_dict.pop("pagination", "offset")
+    cursor = query_dict.pop("cursor", None)
+    count = query_dict.pop("count", None)
     filtering = {key: value for key, value in query_dict.items() if value}
     return {
         "ordering": get_ordering(
@@ -63,7 +218,16 @@ def parse_query(query: BaseModel, model: db.Model, ordering_fields: list) -> dic
             ordering_fields=ordering_fields,
             model=model,
         ),
+        "keyset": get_keyset_ordering(
+            order_request=order_request,
+            ordering_fields=ordering_fields,
+            model=model,
+        ),
+        "model": model,
         "order": order_request,
+        "pagination": pagination,
+        "cursor": cursor,
+        "count": count,
         "offset": offset,
         "limit": limit,
         "filtering": filtering
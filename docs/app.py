@@ -7,13 +7,28 @@ from flask_alembic import Alembic
 from flask_jwt_extended import JWTManager
 from flask_rest_api import Api
 
-from blueprints.docs import docs_bp
+from blueprints.docs import UPLOAD_SIZE_LIMITS, docs_bp
+from commands import docs_cli
 from extensions import db
+from jwt_utils import DEFAULT_ALGORITHM, DEFAULT_KEY_ID, get_verification_keys, register_verification_keys
+from pool_utils import get_engine_options, init_pool_metrics
+from revocation import token_revocations
+from schema_utils import check_schema
+from thumbnails import thumbnail_worker
+from upload_utils import UploadRequest
+
+
+def is_testing():
+    return any(["pytest" in arg for arg in sys.argv])
+
+
+def is_migrating():
+    # `flask db upgrade` as well as `flask --app main db upgrade`
+    return "db" in sys.argv[1:]
 
 
 def get_config():
-    testing = any(["pytest" in arg for arg in sys.argv])
-    env_file = ".env" if not testing else ".env_test"
+    env_file = ".env" if not is_testing() else ".env_test"
     config = {
         **os.environ,
         **dotenv_values(env_file),
@@ -25,23 +40,37 @@ def create_app():
     config = get_config()
 
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.update(config)
-    app.config["JWT_PUBLIC_KEY"] = open(config["JWT_PUBLIC_KEY_PATH"]).read()
+    app.config.setdefault("UPLOAD_SIZE_LIMITS", UPLOAD_SIZE_LIMITS)
+    keys = get_verification_keys(config)
+    key_id = config.get("JWT_KEY_ID", DEFAULT_KEY_ID)
+    app.config["JWT_PUBLIC_KEY"] = keys[key_id]["public_key"]
+    app.config["JWT_ALGORITHM"] = config.get("JWT_ALGORITHM", DEFAULT_ALGORITHM)
+    app.config["JWT_DECODE_ALGORITHMS"] = sorted({key["algorithm"] for key in keys.values()})
     app.config["SQLALCHEMY_DATABASE_URI"] = (
         f"postgresql://{app.config['DB_USER']}:{app.config['DB_PASSWORD']}@"
         f"{app.config['DB_HOST']}:{app.config['DB_PORT']}/{app.config['DB_NAME']}"
     )
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", get_engine_options(config))
 
     db.init_app(app)
-    JWTManager(app)
+    init_pool_metrics(app)
+    # the worker thread is started on the first upload, tests drain the jobs explicitly
+    autostart = str(config.get("THUMBNAIL_WORKER_AUTOSTART", not is_testing())).lower() == "true"
+    thumbnail_worker.init_app(app, autostart=autostart)
+    jwt_manager = JWTManager(app)
+    register_verification_keys(jwt_manager, keys, legacy_key_id=config.get("JWT_LEGACY_KEY_ID", key_id))
+    token_revocations.init_app(app, jwt_manager)
     api = Api(app)
     api.register_blueprint(docs_bp)
+    app.cli.add_command(docs_cli)
 
+    # migrations run with `flask db upgrade` before the app starts, startup only checks the schema version
     alembic = Alembic()
-    alembic.init_app(app)
-    with app.app_context():
-        alembic.upgrade()
-        # alembic.revision(message="Create Doc model")
+    alembic.init_app(app, run_mkdir=False)
+    if not is_migrating():
+        check_schema(app, alembic, mode=config.get("SCHEMA_CHECK", "off" if is_testing() else "cached"))
 
     return app
 
@@ -2,48 +2,59 @@ import json
 import os
 from datetime import datetime
 from http import HTTPStatus
-from typing import Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from PIL import Image, UnidentifiedImageError
-
-from flask import request, current_app as app
+from flask import request
 from flask.views import MethodView
 from flask_pydantic import validate
 from flask_rest_api import Blueprint
 from pydantic import BaseModel
-
-from api_utils import paginate, parse_query, generate_response_error, generate_response_message
+from sqlalchemy import any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+
+from api_utils import (
+    InvalidCursor,
+    generate_response_error,
+    generate_response_message,
+    json_response,
+    paginate,
+    parse_query,
+)
+from download_utils import send_stored_file
 from extensions import db
 
 from jwt_utils import jwt_required
-from models import Doc
+from models import Doc, ThumbnailJob, ThumbnailStatus
+from storage import release_blob, store_blob
+from thumbnails import thumbnail_worker
+from upload_utils import HashingFile, UploadRejected
 
 docs_bp = Blueprint("docs_bp", __name__)
 
 IMG_EXTENSIONS = [".gif", ".jpg", ".jpeg", ".png"]
 DOC_EXTENSIONS = [".doc", ".docx", ".html", ".pdf", ".txt", ".xsl", ".xlsx"]
-VIDEO_EXTENSIONS = [".mp4", ".mov", ".wmv", ".flv", ".avi"]  # TODO validate file size
+VIDEO_EXTENSIONS = [".mp4", ".mov", ".wmv", ".flv", ".avi"]
 
 ALLOWED_EXTENSIONS = IMG_EXTENSIONS + DOC_EXTENSIONS + VIDEO_EXTENSIONS
 
+MB = 1024 * 1024
+LOOKUP_MAX_IDS = 100
 
-def save_thumbnail(main_path, doc_id, extension):
-    thumbnail_path = None
-
-    if extension in IMG_EXTENSIONS:
-        square_fit_size = 100
-        try:
-            image = Image.open(main_path)
-        except UnidentifiedImageError:
-            image = None
+UPLOAD_SIZE_LIMITS = {
+    **dict.fromkeys(IMG_EXTENSIONS, 20 * MB),
+    **dict.fromkeys(DOC_EXTENSIONS, 50 * MB),
+    **dict.fromkeys(VIDEO_EXTENSIONS, 2048 * MB),
+}
 
-        if image:
-            image.thumbnail((square_fit_size, square_fit_size))
-            thumbnail_path = os.path.join(app.config["UPLOAD_FOLDER"], str(doc_id) + "_thumb" + extension)
-            image.save(thumbnail_path)
 
-    return thumbnail_path
+def enqueue_thumbnail(doc, blob):
+    # thumbnails are generated once per blob and shared by every doc referencing it
+    if doc.extension in IMG_EXTENSIONS and blob.thumbnail_status is None:
+        blob.thumbnail_status = ThumbnailStatus.PENDING
+        db.session.add(ThumbnailJob(doc_id=doc.id))
+    doc.thumbnail = blob.thumbnail
+    doc.thumbnail_status = blob.thumbnail_status
 
 
 class DocsGetArgsSchema(BaseModel):
@@ -52,6 +63,14 @@ class DocsGetArgsSchema(BaseModel):
     extension: Optional[str]
     user_id: Optional[UUID]
     order: Optional[str]
+    pagination: Optional[Literal["offset", "cursor"]]
+    cursor: Optional[str]
+    count: Optional[Literal["exact", "estimate", "none"]]
+
+
+@docs_bp.app_errorhandler(UploadRejected)
+def handle_upload_rejected(e):
+    return generate_response_error(status=e.code, message=e.description)
 
 
 @docs_bp.route("/docs/")
@@ -80,11 +99,14 @@ class Docs(MethodView):
             *parsed_query["ordering"]
         )
 
-        return paginate(
-            query=results,
-            url=self.path,
-            parsed_query=parsed_query,
-        )
+        try:
+            return json_response(paginate(
+                query=results,
+                url=self.path,
+                parsed_query=parsed_query,
+            ))
+        except InvalidCursor as e:
+            return generate_response_error(status=HTTPStatus.BAD_REQUEST, message=str(e))
 
     @jwt_required()
     def post(self, user_id):
@@ -94,28 +116,62 @@ class Docs(MethodView):
         filename, extension = os.path.splitext(file.filename)
         extension = extension.lower()
 
-        if extension not in ALLOWED_EXTENSIONS:
+        if extension not in ALLOWED_EXTENSIONS or not isinstance(file.stream, HashingFile):
             return generate_response_error(status=HTTPStatus.BAD_REQUEST, message="The file type is not allowed")
 
         # TODO validate images
 
+        # the body was streamed to disk while parsing, hashed and checked against UPLOAD_SIZE_LIMITS
+        blob = store_blob(file.stream)
         doc = self.model(
             name=filename,
             extension=extension,
-            path="/",  # will setup the path later
+            path=blob.path,
             user_id=user_id,
-            created_at=datetime.now()
+            created_at=datetime.now(),
+            content_hash=blob.content_hash,
+            size=blob.size,
+            blob_hash=blob.content_hash,
         )
         db.session.add(doc)
         db.session.flush()
-        doc.path = os.path.join(app.config["UPLOAD_FOLDER"], str(doc.id) + extension)
-        file.save(doc.path)
-        doc.thumbnail = save_thumbnail(doc.path, doc.id, extension)
+        enqueue_thumbnail(doc, blob)
         db.session.commit()
+        thumbnail_worker.wake()
 
         return generate_response_message(status=HTTPStatus.CREATED, message=json.dumps({"id": str(doc.id)}))
 
 
+class DocsLookupSchema(BaseModel):
+    ids: List[UUID]
+
+
+@docs_bp.route("/docs/lookup")
+class DocsLookup(MethodView):
+    model = Doc
+
+    @jwt_required()
+    @validate()
+    def post(self, user_id, body: DocsLookupSchema, *args, **kwargs):
+        if not 0 < len(body.ids) <= LOOKUP_MAX_IDS:
+            return generate_response_error(
+                status=HTTPStatus.BAD_REQUEST, message=f"Provide between 1 and {LOOKUP_MAX_IDS} ids"
+            )
+
+        # one round trip for the whole batch, documents of other users are reported as not found
+        columns = [getattr(self.model, column) for column in self.model.serialize_columns]
+        rows = self.model.query.with_entities(*columns).filter(
+            self.model.id == any_(bindparam("ids", body.ids, type_=ARRAY(PG_UUID(as_uuid=True)))),
+            self.model.user_id == user_id,
+            self.model.deleted.is_(False),
+        ).all()
+        docs = {row.id: self.model.serialize_row(row) for row in rows}
+
+        return json_response({
+            "results": [docs.get(doc_id, {"id": str(doc_id), "error": "not_found"}) for doc_id in body.ids],
+        })
+
+
 @docs_bp.route("/docs/<item_id>")
 class DocsById(MethodView):
     @jwt_required()
@@ -130,5 +186,45 @@ class DocsById(MethodView):
         if str(doc.user_id) != str(user_id):
             return generate_response_error(status=HTTPStatus.FORBIDDEN, message="User is not owner of the document")
         doc.deleted = True
+        doc.deleted_at = datetime.now()
+        if doc.blob_hash:
+            release_blob(doc.blob_hash)
         db.session.commit()
         return generate_response_message(status=HTTPStatus.NO_CONTENT)
+
+
+def get_live_doc(item_id):
+    try:
+        UUID(item_id)
+    except ValueError:
+        return None
+    return Doc.query.filter_by(id=item_id, deleted=False).first()
+
+
+@docs_bp.route("/docs/<item_id>/content")
+class DocContent(MethodView):
+    @jwt_required()
+    def get(self, item_id, *args, **kwargs):
+        doc = get_live_doc(item_id)
+        if not doc or not os.path.exists(doc.path):
+            return generate_response_error(status=HTTPStatus.NOT_FOUND, message="File not found")
+        return send_stored_file(
+            doc.path,
+            download_name=doc.name + doc.extension,
+            etag=doc.content_hash or True,
+            ranges=doc.extension in VIDEO_EXTENSIONS,
+        )
+
+
+@docs_bp.route("/docs/<item_id>/thumbnail")
+class DocThumbnail(MethodView):
+    @jwt_required()
+    def get(self, item_id, *args, **kwargs):
+        doc = get_live_doc(item_id)
+        if not doc or not doc.thumbnail or not os.path.exists(doc.thumbnail):
+            return generate_response_error(status=HTTPStatus.NOT_FOUND, message="Thumbnail not found")
+        return send_stored_file(
+            doc.thumbnail,
+            download_name=f"{doc.name}_thumb{doc.extension}",
+            etag=f"{doc.content_hash}-thumb" if doc.content_hash else True,
+        )
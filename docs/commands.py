@@ -0,0 +1,153 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, jsonify
+from flask.cli import AppGroup
+
+from api_utils import get_rows, json_response
+from extensions import db
+from models import Doc
+from purge import purge
+from storage import collect_garbage
+from thumbnails import thumbnail_worker
+
+docs_cli = AppGroup("docs")
+
+STARTUP_SCRIPT = """
+import sys
+import time
+from app import create_app
+started = time.perf_counter()
+app = create_app()
+if sys.argv[1] == "upgrade":
+    with app.app_context():
+        app.extensions["alembic"].upgrade()
+print(time.perf_counter() - started)
+"""
+# the startup before migrations moved out of create_app, and the schema check modes after it
+STARTUP_VARIANTS = (
+    ("upgrade", "off", "migrate on startup"),
+    ("check", "always", "schema check"),
+    ("check", "cached", "cached schema check"),
+    ("check", "off", "no schema check"),
+)
+
+
+def measure(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@docs_cli.command("benchmark-list")
+@click.option("--rows", default=10_000, show_default=True)
+@click.option("--repeat", default=5, show_default=True)
+def benchmark_list(rows: int, repeat: int):
+    """Compare ORM and column-projected serialization of a docs list page."""
+    user_id = uuid.uuid4()
+    started = datetime.now()
+    db.session.execute(
+        Doc.__table__.insert(),
+        [
+            {
+                "name": f"benchmark_{i}",
+                "extension": ".txt",
+                "path": f"benchmark_{i}.txt",
+                "user_id": user_id,
+                "deleted": False,
+                "created_at": started + timedelta(seconds=i),
+            }
+            for i in range(rows)
+        ],
+    )
+    query = Doc.query.filter_by(user_id=user_id, deleted=False).order_by(Doc.created_at)
+
+    def orm():
+        db.session.expunge_all()
+        return jsonify({"results": [i.serialize for i in query.limit(rows).all()]}).get_data()
+
+    def projected():
+        return json_response({"results": [Doc.serialize_row(i) for i in get_rows(query, Doc, rows)]}).get_data()
+
+    try:
+        if orm() != projected():
+            raise click.ClickException("The serialized outputs differ")
+        for name, fn in (("orm", orm), ("projected", projected)):
+            elapsed = measure(fn, repeat)
+            click.echo(f"{name:<10} {elapsed * 1000:8.1f} ms {rows / elapsed:12.0f} rows/s")
+    finally:
+        db.session.rollback()
+
+
+@docs_cli.command("measure-startup")
+@click.option("--repeat", default=5, show_default=True)
+def measure_startup(repeat: int):
+    """Measure the cold start of a fresh interpreter creating the app."""
+    # imports dominate the process time, create_app is reported separately so the schema check isn't lost in noise
+    click.echo(f"{'':<20} {'process':>11} {'create_app':>11}")
+    for action, schema_check, name in STARTUP_VARIANTS:
+        timings, create_timings = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, action],
+                cwd=current_app.root_path,
+                env={**os.environ, "SCHEMA_CHECK": schema_check},
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            timings.append(time.perf_counter() - started)
+            create_timings.append(float(result.stdout.split()[-1]))
+        click.echo(
+            f"{name:<20} {statistics.median(timings) * 1000:8.1f} ms "
+            f"{statistics.median(create_timings) * 1000:8.1f} ms"
+        )
+
+
+@docs_cli.command("process-thumbnails")
+@click.option("--once", is_flag=True, help="Process the pending jobs and exit.")
+def process_thumbnails(once: bool):
+    """Generate pending thumbnails, run this instead of the in-process worker when it is disabled."""
+    if once:
+        click.echo(f"Processed {thumbnail_worker.drain()} thumbnail jobs")
+        return
+    thumbnail_worker.run()
+
+
+@docs_cli.command("gc-blobs")
+@click.option("--grace-period", default=3_600, show_default=True, help="Seconds an unreferenced blob is kept.")
+@click.option("--batch-size", default=100, show_default=True)
+def gc_blobs(grace_period: int, batch_size: int):
+    """Delete blobs and thumbnails that are no longer referenced by any document."""
+    stats = collect_garbage(grace_period=grace_period, batch_size=batch_size)
+    click.echo(f"Deleted {stats['blobs']} blobs, {stats['bytes']} bytes")
+
+
+@docs_cli.command("purge")
+@click.option("--retention", default=30 * 24 * 3_600, show_default=True, help="Seconds a deleted doc is kept.")
+@click.option("--grace-period", default=24 * 3_600, show_default=True, help="Seconds before unreferenced files go.")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--interval", default=0, help="Repeat every INTERVAL seconds instead of running once.")
+def purge_docs(retention: int, grace_period: int, batch_size: int, interval: int):
+    """Hard-delete soft-deleted docs past the retention window and remove their files."""
+    while True:
+        stats = purge(retention=retention, grace_period=grace_period, batch_size=batch_size)
+        click.echo(
+            f"Purged {stats['docs']['docs']} docs, {stats['blobs']['blobs']} blobs and "
+            f"{stats['orphans']['files']} orphaned files, "
+            f"{stats['docs']['bytes'] + stats['blobs']['bytes'] + stats['orphans']['bytes']} bytes "
+            f"in {stats['seconds']:.1f}s ({stats['docs_per_second']:.0f} docs/s)"
+        )
+        if not interval:
+            return
+        time.sleep(interval)
@@ -0,0 +1,33 @@
+import os
+
+from flask import current_app as app, request
+from werkzeug.utils import send_file
+
+X_SENDFILE = "x-sendfile"
+X_ACCEL_REDIRECT = "x-accel-redirect"
+
+
+def send_stored_file(path: str, download_name: str, etag, ranges: bool = False):
+    # SENDFILE_MODE hands the file to a fronting proxy, otherwise the server streams it with wsgi.file_wrapper
+    mode = app.config.get("SENDFILE_MODE", "").lower()
+    environ = request.environ
+    if not ranges or mode:
+        # a fronting proxy applies ranges to the file it serves itself
+        environ = {key: value for key, value in environ.items() if key != "HTTP_RANGE"}
+
+    response = send_file(
+        path,
+        environ,
+        download_name=download_name,
+        conditional=True,
+        etag=etag,
+        use_x_sendfile=mode in (X_SENDFILE, X_ACCEL_REDIRECT),
+        response_class=app.response_class,
+    )
+    if not ranges:
+        response.headers.pop("Accept-Ranges", None)
+    if mode == X_ACCEL_REDIRECT and "X-Sendfile" in response.headers:
+        del response.headers["X-Sendfile"]
+        prefix = app.config.get("X_ACCEL_PREFIX", "/protected").rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{os.path.relpath(path, app.config['UPLOAD_FOLDER'])}"
+    return response
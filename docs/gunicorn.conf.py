@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# the app and the verification keys are loaded once in the master and shared with the forked workers
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+wsgi_app = "main:app"
+
+
+def post_fork(server, worker):
+    from extensions import db
+    from main import app
+
+    # the schema check leaves a pooled connection in the master, a worker must not share its socket
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,11 +1,39 @@
 from functools import wraps
 from http import HTTPStatus
 
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from flask import current_app
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended import JWTManager, verify_jwt_in_request, get_jwt_identity
+from jwt import InvalidTokenError
 
 from http_utils import ResponseError
 
+DEFAULT_ALGORITHM = "RS256"
+DEFAULT_KEY_ID = "default"
+
+
+def get_verification_keys(config: dict) -> dict:
+    keys = {
+        config.get("JWT_KEY_ID", DEFAULT_KEY_ID): {
+            "algorithm": config.get("JWT_ALGORITHM", DEFAULT_ALGORITHM),
+            "public_key": load_pem_public_key(open(config["JWT_PUBLIC_KEY_PATH"], "rb").read()),
+        }
+    }
+    # previous keys that are still accepted, as "kid:algorithm:public_key_path,..."
+    for key in filter(None, config.get("JWT_PREVIOUS_KEYS", "").split(",")):
+        kid, algorithm, path = key.strip().split(":", 2)
+        keys[kid] = {"algorithm": algorithm, "public_key": load_pem_public_key(open(path, "rb").read())}
+    return keys
+
+
+def register_verification_keys(jwt_manager: JWTManager, keys: dict, legacy_key_id: str):
+    @jwt_manager.decode_key_loader
+    def decode_key_loader(jwt_header, jwt_data):
+        key = keys.get(jwt_header.get("kid", legacy_key_id))
+        if not key or key["algorithm"] != jwt_header.get("alg"):
+            raise InvalidTokenError("Unknown key id")
+        return key["public_key"]
+
 
 def jwt_required():
     def wrapper(fn):
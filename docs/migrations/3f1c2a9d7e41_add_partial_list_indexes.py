@@ -0,0 +1,46 @@
+"""Add partial list indexes
+
+Revision ID: 3f1c2a9d7e41
+Revises: 5b67562fa3ac
+Create Date: 2026-10-17 20:45:12.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e41'
+down_revision = '5b67562fa3ac'
+branch_labels = None
+depends_on = None
+
+# the docs list always filters on deleted = false and orders by (created_at, id) or (name, id)
+INDEXES = {
+    'ix_docs_docs_live_created_at': ['created_at', 'id'],
+    'ix_docs_docs_live_name': ['name', 'id'],
+    'ix_docs_docs_live_user_id_created_at': ['user_id', 'created_at', 'id'],
+    'ix_docs_docs_live_user_id_name': ['user_id', 'name', 'id'],
+    'ix_docs_docs_live_extension_created_at': ['extension', 'created_at', 'id'],
+}
+
+
+def upgrade() -> None:
+    # build the indexes without locking writes on a large table
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(
+                name,
+                'docs',
+                columns,
+                unique=False,
+                schema='docs',
+                postgresql_where=sa.text('deleted = false'),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.drop_index(name, table_name='docs', schema='docs', postgresql_concurrently=True)
@@ -10,9 +10,59 @@ from settings import SCHEMA_NAME
 fs_mixin = FlaskSerialize(db)
 
 
+class ThumbnailStatus:
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Blob(db.Model):
+    __tablename__ = "blobs"
+    __table_args__ = (
+        db.Index("ix_docs_blobs_unreferenced_at", "unreferenced_at", postgresql_where=sa_text("ref_count = 0")),
+        {'schema': SCHEMA_NAME},
+    )
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger(), nullable=False)
+    path = db.Column(db.String(1000), nullable=False)
+    thumbnail = db.Column(db.String(1000), nullable=True)
+    thumbnail_status = db.Column(db.String(20), nullable=True)
+    ref_count = db.Column(db.Integer(), nullable=False, default=0)
+    created_at = db.Column(db.DateTime(), nullable=False, default=datetime.now)
+    unreferenced_at = db.Column(db.DateTime(), nullable=True)
+
+
 class Doc(db.Model, fs_mixin):
     __tablename__ = "docs"
-    __table_args__ = {'schema': SCHEMA_NAME}
+    __table_args__ = (
+        # partial indexes for the list queries, see migration 3f1c2a9d7e41
+        db.Index("ix_docs_docs_live_created_at", "created_at", "id", postgresql_where=sa_text("deleted = false")),
+        db.Index("ix_docs_docs_live_name", "name", "id", postgresql_where=sa_text("deleted = false")),
+        db.Index(
+            "ix_docs_docs_live_user_id_created_at",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_where=sa_text("deleted = false"),
+        ),
+        db.Index(
+            "ix_docs_docs_live_user_id_name",
+            "user_id",
+            "name",
+            "id",
+            postgresql_where=sa_text("deleted = false"),
+        ),
+        db.Index(
+            "ix_docs_docs_live_extension_created_at",
+            "extension",
+            "created_at",
+            "id",
+            postgresql_where=sa_text("deleted = false"),
+        ),
+        db.Index("ix_docs_docs_deleted_at", "deleted_at", postgresql_where=sa_text("deleted = true")),
+        {'schema': SCHEMA_NAME},
+    )
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, server_default=sa_text("uuid_generate_v4()"))
     name = db.Column(db.String(255), index=True, nullable=False)
@@ -20,8 +70,33 @@ class Doc(db.Model, fs_mixin):
     path = db.Column(db.String(1000), nullable=False)
     user_id = db.Column(UUID(as_uuid=True), nullable=False)
     deleted = db.Column(db.Boolean(), default=False)
+    deleted_at = db.Column(db.DateTime(), nullable=True)
     created_at = db.Column(db.DateTime(), default=datetime.now())
     thumbnail = db.Column(db.String(1000), nullable=True)
+    thumbnail_status = db.Column(db.String(20), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    size = db.Column(db.BigInteger(), nullable=True)
+    # documents uploaded before the blob storage keep their own file and have no blob
+    blob_hash = db.Column(
+        db.String(64),
+        db.ForeignKey(f"{SCHEMA_NAME}.blobs.content_hash", ondelete="SET NULL"),
+        index=True,
+        nullable=True,
+    )
+
+    serialize_columns = (
+        "id",
+        "name",
+        "extension",
+        "path",
+        "user_id",
+        "deleted",
+        "created_at",
+        "thumbnail",
+        "thumbnail_status",
+        "content_hash",
+        "size",
+    )
 
     @property
     def serialize(self):
@@ -34,4 +109,30 @@ class Doc(db.Model, fs_mixin):
             "deleted": self.deleted,
             "created_at": str(self.created_at),  # TODO customize date format
             "thumbnail": self.thumbnail,
+            "thumbnail_status": self.thumbnail_status,
+            "content_hash": self.content_hash,
+            "size": self.size,
         }
+
+    @staticmethod
+    def serialize_row(row) -> dict:
+        # UUIDs are left to the JSON encoder, which renders them the same as str()
+        data = row._asdict()
+        data["created_at"] = str(data["created_at"])
+        return data
+
+
+class ThumbnailJob(db.Model):
+    __tablename__ = "thumbnail_jobs"
+    __table_args__ = (
+        db.Index("ix_docs_thumbnail_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+        {'schema': SCHEMA_NAME},
+    )
+
+    id = db.Column(db.BigInteger(), primary_key=True)
+    doc_id = db.Column(UUID(as_uuid=True), db.ForeignKey(f"{SCHEMA_NAME}.docs.id", ondelete="CASCADE"), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=ThumbnailStatus.PENDING)
+    attempts = db.Column(db.Integer(), nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(), nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text(), nullable=True)
+    created_at = db.Column(db.DateTime(), nullable=False, default=datetime.now)
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+
+from flask import Flask, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+
+def get_engine_options(config: dict) -> dict:
+    # pool_size should cover the worker threads plus the background workers of a process
+    return {
+        "pool_size": int(config.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(config.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(config.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(config.get("DB_POOL_RECYCLE", 1_800)),
+        "pool_pre_ping": str(config.get("DB_POOL_PRE_PING", True)).lower() == "true",
+        "connect_args": {"connect_timeout": int(config.get("DB_CONNECT_TIMEOUT", 5))},
+    }
+
+
+class PoolStats:
+    def __init__(self):
+        self.opened = 0
+        self.setup_time = 0.0
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._lock = threading.Lock()
+
+    def record_connection(self, duration: float):
+        with self._lock:
+            self.opened += 1
+            self.setup_time += duration
+
+    def checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checkin(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self) -> dict:
+        return {
+            "opened": self.opened,
+            "checkouts": self.checkouts,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "setup_ms": round(self.setup_time * 1000, 1),
+            # share of checkouts served by an already open connection
+            "reuse_ratio": round(1 - self.opened / self.checkouts, 3) if self.checkouts else None,
+        }
+
+
+pool_stats = PoolStats()
+
+
+@event.listens_for(Engine, "do_connect")
+def connect(dialect, connection_record, cargs, cparams):
+    started = time.perf_counter()
+    connection = dialect.connect(*cargs, **cparams)
+    duration = time.perf_counter() - started
+
+    pool_stats.record_connection(duration)
+    if has_request_context():
+        g.db_connect = g.get("db_connect", 0.0) + duration
+    logger.info("Opened a database connection in %.1fms %s", duration * 1000, pool_stats.stats())
+    return connection
+
+
+@event.listens_for(Pool, "checkout")
+def checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats.checkout()
+
+
+@event.listens_for(Pool, "checkin")
+def checkin(dbapi_connection, connection_record):
+    pool_stats.checkin()
+
+
+def add_server_timing(response):
+    if g.get("db_connect"):
+        timing = f"db-connect;dur={g.db_connect * 1000:.1f}"
+        response.headers["Server-Timing"] = ", ".join(filter(None, (response.headers.get("Server-Timing"), timing)))
+    return response
+
+
+def init_pool_metrics(app: Flask):
+    app.after_request(add_server_timing)
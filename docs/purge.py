@@ -0,0 +1,112 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app as app
+
+from extensions import db
+from models import Blob, Doc
+from storage import collect_garbage, is_blob_path, lock_blob_file
+from upload_utils import TEMP_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+def unlink(path: str) -> int:
+    try:
+        size = os.path.getsize(path)
+        os.unlink(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def get_existing_blobs(hashes: list) -> set:
+    query = Blob.query.with_entities(Blob.content_hash).filter(Blob.content_hash.in_(hashes))
+    return {row.content_hash for row in query}
+
+
+def purge_deleted_docs(retention: int, batch_size: int) -> dict:
+    stats = {"docs": 0, "files": 0, "bytes": 0}
+    cutoff = datetime.now() - timedelta(seconds=retention)
+    while True:
+        # SKIP LOCKED lets several nodes purge at the same time without waiting on each other
+        docs = (
+            Doc.query.with_for_update(skip_locked=True)
+            .filter_by(deleted=True)
+            .filter(Doc.deleted_at <= cutoff)
+            .order_by(Doc.deleted_at)
+            .limit(batch_size)
+            .all()
+        )
+        for doc in docs:
+            for path in (doc.path, doc.thumbnail):
+                # blob files are shared and removed by the blob garbage collection only, blob_hash is no
+                # indication: it is set to NULL once the blob is collected, and a re-upload recreates the file
+                if path and not is_blob_path(path):
+                    size = unlink(path)
+                    stats["files"] += bool(size)
+                    stats["bytes"] += size
+        if docs:
+            Doc.query.filter(Doc.id.in_([doc.id for doc in docs])).delete(synchronize_session=False)
+            stats["docs"] += len(docs)
+        db.session.commit()
+
+        if len(docs) < batch_size:
+            return stats
+
+
+def sweep_orphaned_files(grace_period: int, batch_size: int) -> dict:
+    stats = {"files": 0, "bytes": 0}
+    cutoff = time.time() - grace_period
+    upload_folder = app.config["UPLOAD_FOLDER"]
+
+    # temporary files of uploads that never completed
+    for entry in os.scandir(upload_folder):
+        if entry.is_file() and entry.name.startswith(TEMP_PREFIX) and entry.stat().st_mtime < cutoff:
+            stats["bytes"] += unlink(entry.path)
+            stats["files"] += 1
+
+    # blob files written by uploads whose transaction was rolled back
+    paths = defaultdict(list)
+    for root, _, names in os.walk(os.path.join(upload_folder, "blobs")):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.stat(path).st_mtime < cutoff:
+                paths[name.split("_thumb")[0]].append(path)
+
+    hashes = list(paths)
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start : start + batch_size]
+        missing = set(batch) - get_existing_blobs(batch)
+        # an upload reusing one of these files holds its lock until the blob row is committed, skip those and
+        # check the others again once locked
+        locked = [content_hash for content_hash in missing if lock_blob_file(content_hash, wait=False)]
+        for content_hash in set(locked) - get_existing_blobs(locked):
+            for path in paths[content_hash]:
+                stats["bytes"] += unlink(path)
+                stats["files"] += 1
+        db.session.commit()
+    return stats
+
+
+def purge(retention: int, grace_period: int, batch_size: int) -> dict:
+    started = time.perf_counter()
+    stats = {
+        "docs": purge_deleted_docs(retention=retention, batch_size=batch_size),
+        "blobs": collect_garbage(grace_period=grace_period, batch_size=batch_size),
+        "orphans": sweep_orphaned_files(grace_period=grace_period, batch_size=batch_size),
+    }
+    stats["seconds"] = time.perf_counter() - started
+    stats["docs_per_second"] = stats["docs"]["docs"] / stats["seconds"] if stats["seconds"] else 0
+    logger.info(
+        "Purged %s docs, %s blobs, %s orphaned files in %.1fs (%.0f docs/s)",
+        stats["docs"]["docs"],
+        stats["blobs"]["blobs"],
+        stats["orphans"]["files"],
+        stats["seconds"],
+        stats["docs_per_second"],
+    )
+    return stats
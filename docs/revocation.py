@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 60
+UNAVAILABLE_MODES = ("reject", "redis", "accept")
+
+
+class TokenRevocations:
+    def __init__(self):
+        self.client_factory = None
+        self._client = None
+        self._revoked = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._pruned_at = 0
+
+    def init_app(self, app, jwt_manager):
+        self.url = app.config.get("REDIS_URL", "redis://redis:6379")
+        self.key = app.config.get("TOKEN_REVOCATION_KEY", "token-revocations")
+        self.channel = app.config.get("TOKEN_REVOCATION_CHANNEL", "token-revocations")
+        self.startup_timeout = float(app.config.get("TOKEN_REVOCATION_STARTUP_TIMEOUT", 1))
+        self.retry_interval = float(app.config.get("TOKEN_REVOCATION_RETRY_INTERVAL", 5))
+        self.enabled = str(app.config.get("TOKEN_REVOCATION_ENABLED", True)).lower() == "true"
+        # what to do with a token while the feed is not loaded yet: look it up in redis and reject it while redis is
+        # unreachable, reject every token, or accept every token
+        self.unavailable = app.config.get("TOKEN_REVOCATION_UNAVAILABLE", "redis")
+        if self.unavailable not in UNAVAILABLE_MODES:
+            raise ValueError(f"TOKEN_REVOCATION_UNAVAILABLE must be one of {', '.join(UNAVAILABLE_MODES)}")
+        if self.client_factory is None:
+            self.client_factory = lambda: redis.Redis.from_url(self.url)
+        jwt_manager.token_in_blocklist_loader(self.is_token_revoked)
+        app.extensions["token_revocations"] = self
+
+    def is_token_revoked(self, jwt_header, jwt_payload) -> bool:
+        if not self.enabled:
+            return False
+        self.start()
+        if not self._ready.is_set():
+            return self.is_revoked_unloaded(jwt_payload.get("jti"))
+        # a plain dict lookup, the subscriber thread keeps it in sync with auth
+        expires_at = self._revoked.get(jwt_payload.get("jti"))
+        return expires_at is not None and expires_at > time.time()
+
+    def is_revoked_unloaded(self, jti) -> bool:
+        if self.unavailable == "accept":
+            return False
+        if self.unavailable == "reject":
+            return True
+        if jti is None:
+            return False
+        try:
+            expires_at = self._client.zscore(self.key, jti)
+        except redis.RedisError:
+            logger.exception("Failed to look up the revocation of %s, rejecting the token", jti)
+            return True
+        return expires_at is not None and expires_at > time.time()
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            # the subscriber thread does not survive a fork, start one per process
+            if self._pid == os.getpid():
+                return
+            self._revoked = {}
+            self._client = self.client_factory()
+            self._ready.clear()
+            self._thread = threading.Thread(target=self.run, name="token-revocations", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        if not self._ready.wait(self.startup_timeout):
+            logger.warning("Token revocations are not loaded yet, tokens are checked in %s mode", self.unavailable)
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception:
+                # the thread is started once per process, it must outlive any error
+                logger.exception("Lost the token revocation feed, reconnecting")
+            time.sleep(self.retry_interval)
+
+    def listen(self):
+        client = self.client_factory()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            # subscribe before reading the snapshot, so nothing published in between is missed
+            pubsub.subscribe(self.channel)
+            snapshot = client.zrangebyscore(self.key, time.time(), "+inf", withscores=True)
+            self._revoked = {jti.decode(): expires_at for jti, expires_at in snapshot}
+            self._ready.set()
+
+            while True:
+                message = pubsub.get_message(timeout=1)
+                if message:
+                    self.handle(message)
+                self.prune()
+        finally:
+            pubsub.close()
+
+    def handle(self, message):
+        try:
+            revocation = json.loads(message["data"])
+            jti, expires_at = revocation["jti"], float(revocation["exp"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring a malformed token revocation %r", message["data"])
+            return
+        self._revoked[jti] = expires_at
+
+    def prune(self):
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        self._revoked = {jti: expires_at for jti, expires_at in self._revoked.items() if expires_at > now}
+
+
+token_revocations = TokenRevocations()
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+from flask import Flask
+from flask_alembic import Alembic
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CHECK_MODES = ("cached", "always", "off")
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def get_migrations_fingerprint(alembic: Alembic, database_uri: str) -> str:
+    # revision files are only listed, not imported, so a cache hit never loads the migration graph
+    digest = hashlib.sha256(database_uri.encode("utf-8"))
+    for location in alembic.config.get_main_option("version_locations").split(","):
+        for name in sorted(os.listdir(location)):
+            if name.endswith(".py"):
+                digest.update(name.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def get_schema_heads(alembic: Alembic):
+    # the connection is closed when the app context is torn down
+    current = set(alembic.migration_context.get_current_heads())
+    return current, set(alembic.script_directory.get_heads())
+
+
+def check_schema(app: Flask, alembic: Alembic, mode: str = "cached"):
+    if mode not in SCHEMA_CHECK_MODES:
+        raise ValueError(f"SCHEMA_CHECK must be one of {', '.join(SCHEMA_CHECK_MODES)}")
+    if mode == "off":
+        return
+
+    with app.app_context():
+        fingerprint = get_migrations_fingerprint(alembic, app.config["SQLALCHEMY_DATABASE_URI"])
+        cache_path = os.path.join(
+            app.config.get("SCHEMA_CHECK_CACHE_DIR") or tempfile.gettempdir(), f"docs-schema-{fingerprint}"
+        )
+        if mode == "cached" and os.path.exists(cache_path):
+            return
+
+        current, heads = get_schema_heads(alembic)
+        if current != heads:
+            unknown = current - {revision.revision for revision in alembic.script_directory.walk_revisions()}
+            if unknown:
+                # a newer release already migrated the database, keep serving during a rolling deploy
+                logger.warning("Database schema is at unknown revision %s", ", ".join(sorted(unknown)))
+                return
+            raise SchemaOutdated(
+                f"Database schema is at {', '.join(sorted(current)) or 'no revision'}, "
+                f"expected {', '.join(sorted(heads))}. Run `flask db upgrade`."
+            )
+
+    with open(cache_path, "w"):
+        pass
@@ -0,0 +1,99 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app as app
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from extensions import db
+from models import Blob
+from upload_utils import HashingFile
+
+logger = logging.getLogger(__name__)
+
+
+def get_blob_path(content_hash: str) -> str:
+    return os.path.join(app.config["UPLOAD_FOLDER"], "blobs", content_hash[:2], content_hash)
+
+
+def is_blob_path(path: str) -> bool:
+    blobs_folder = os.path.abspath(os.path.join(app.config["UPLOAD_FOLDER"], "blobs"))
+    return os.path.commonpath([blobs_folder, os.path.abspath(path)]) == blobs_folder
+
+
+def get_thumbnail_path(blob: Blob, extension: str) -> str:
+    return f"{blob.path}_thumb{extension}"
+
+
+def lock_blob_file(content_hash: str, wait: bool = True) -> bool:
+    # held until the transaction ends, it keeps the orphan sweep away from a file whose blob row is not committed yet
+    key = func.hashtextextended(content_hash, 0)
+    if wait:
+        db.session.execute(select(func.pg_advisory_xact_lock(key)))
+        return True
+    return db.session.execute(select(func.pg_try_advisory_xact_lock(key))).scalar()
+
+
+def store_blob(stream: HashingFile) -> Blob:
+    content_hash = stream.content_hash
+    lock_blob_file(content_hash)
+    while True:
+        db.session.execute(
+            insert(Blob)
+            .values(
+                content_hash=content_hash,
+                size=stream.size,
+                path=get_blob_path(content_hash),
+                ref_count=0,
+                created_at=datetime.now(),
+            )
+            .on_conflict_do_nothing()
+        )
+        # the row lock keeps the garbage collector away until the reference is committed
+        blob = Blob.query.with_for_update().populate_existing().get(content_hash)
+        if blob:
+            break
+
+    if os.path.exists(blob.path):
+        stream.close()
+    else:
+        os.makedirs(os.path.dirname(blob.path), exist_ok=True)
+        stream.save(blob.path)
+
+    blob.ref_count += 1
+    blob.unreferenced_at = None
+    return blob
+
+
+def release_blob(content_hash: str):
+    blob = Blob.query.with_for_update().populate_existing().get(content_hash)
+    if blob is None:
+        return
+    blob.ref_count = max(blob.ref_count - 1, 0)
+    if not blob.ref_count:
+        blob.unreferenced_at = datetime.now()
+
+
+def collect_garbage(grace_period: int, batch_size: int) -> dict:
+    stats = {"blobs": 0, "bytes": 0}
+    while True:
+        blobs = (
+            Blob.query.with_for_update(skip_locked=True)
+            .filter(Blob.ref_count == 0, Blob.unreferenced_at <= datetime.now() - timedelta(seconds=grace_period))
+            .limit(batch_size)
+            .all()
+        )
+        # files are removed while the rows are locked, so a concurrent upload of the same content waits for us
+        for blob in blobs:
+            for path in (blob.path, blob.thumbnail):
+                if path and os.path.exists(path):
+                    os.unlink(path)
+            stats["blobs"] += 1
+            stats["bytes"] += blob.size
+            db.session.delete(blob)
+        db.session.commit()
+
+        if len(blobs) < batch_size:
+            logger.info("Collected %s blobs, %s bytes", stats["blobs"], stats["bytes"])
+            return stats
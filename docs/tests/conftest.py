@@ -1,14 +1,23 @@
 import uuid
 from datetime import timedelta
 
+import fakeredis
 import pytest
 
 from main import app
 from extensions import db
 from models import Doc
+from revocation import token_revocations
 from tests.utils import generate_token, get_file
 
 
+@pytest.fixture(scope="session", autouse=True)
+def redis_server():
+    server = fakeredis.FakeServer()
+    token_revocations.client_factory = lambda: fakeredis.FakeRedis(server=server)
+    return server
+
+
 @pytest.fixture
 def test_app():
     with app.app_context():
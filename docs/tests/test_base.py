@@ -1,5 +1,19 @@
+import json
+import os
+import sys
+import time
+import uuid
 from http import HTTPStatus
 
+import fakeredis
+import pytest
+
+from app import is_migrating
+from pool_utils import pool_stats
+from revocation import TokenRevocations, token_revocations
+from schema_utils import SchemaOutdated, check_schema
+from tests.utils import generate_token
+
 
 def test_unauthorized(client):
     response = client.get('/')
@@ -10,3 +24,107 @@ def test_authorized(client, auth_headers):
     response = client.get('/', headers=auth_headers)
     assert response.status_code == HTTPStatus.OK
     assert response.json["result"] == "ok"
+
+
+def test_unknown_key_id(client):
+    token = generate_token(uuid.uuid4(), headers={"kid": "unknown"})
+    response = client.get('/', headers={"Authorization": f"Token {token}"})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_revoked_token(client, redis_server):
+    token = generate_token(uuid.uuid4(), jti="revoked")
+    headers = {"Authorization": f"Token {token}"}
+    assert client.get('/', headers=headers).status_code == HTTPStatus.OK
+
+    # what auth publishes on logout
+    expires_at = int(time.time()) + 60
+    publisher = fakeredis.FakeRedis(server=redis_server)
+    publisher.zadd(token_revocations.key, {"revoked": expires_at})
+    publisher.publish(token_revocations.channel, json.dumps({"jti": "revoked", "exp": expires_at}))
+
+    deadline = time.time() + 5
+    while time.time() < deadline and client.get('/', headers=headers).status_code == HTTPStatus.OK:
+        time.sleep(0.05)
+    assert client.get('/', headers=headers).status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_malformed_revocation_is_skipped(client, redis_server):
+    token = generate_token(uuid.uuid4(), jti="revoked-after-malformed")
+    headers = {"Authorization": f"Token {token}"}
+    assert client.get('/', headers=headers).status_code == HTTPStatus.OK
+
+    publisher = fakeredis.FakeRedis(server=redis_server)
+    for message in ("not json", json.dumps({"jti": "missing-exp"}), json.dumps(["not", "an", "object"])):
+        publisher.publish(token_revocations.channel, message)
+    # the subscriber keeps applying revocations published after the malformed ones
+    expires_at = int(time.time()) + 60
+    publisher.publish(token_revocations.channel, json.dumps({"jti": "revoked-after-malformed", "exp": expires_at}))
+
+    deadline = time.time() + 5
+    while time.time() < deadline and client.get('/', headers=headers).status_code == HTTPStatus.OK:
+        time.sleep(0.05)
+    assert client.get('/', headers=headers).status_code == HTTPStatus.UNAUTHORIZED
+    assert token_revocations._thread.is_alive()
+
+
+@pytest.mark.parametrize(
+    "mode, revoked, other", [("reject", True, True), ("redis", True, False), ("accept", False, False)]
+)
+def test_revocations_not_loaded(redis_server, mode, revoked, other):
+    revocations = TokenRevocations()
+    revocations.enabled = True
+    revocations.key = "unloaded-revocations"
+    revocations.unavailable = mode
+    revocations._client = fakeredis.FakeRedis(server=redis_server)
+    # the subscriber is considered started but has not loaded the feed
+    revocations._pid = os.getpid()
+    revocations._client.zadd(revocations.key, {"revoked": int(time.time()) + 60})
+
+    assert revocations.is_token_revoked({}, {"jti": "revoked"}) is revoked
+    assert revocations.is_token_revoked({}, {"jti": "other"}) is other
+
+
+def test_schema_check(test_app, tmp_path):
+    test_app.config["SCHEMA_CHECK_CACHE_DIR"] = str(tmp_path)
+    alembic = test_app.extensions["alembic"]
+    try:
+        alembic.stamp("base")
+        with pytest.raises(SchemaOutdated):
+            check_schema(test_app, alembic, mode="always")
+        assert not list(tmp_path.iterdir())
+
+        alembic.stamp("heads")
+        check_schema(test_app, alembic, mode="cached")
+        assert len(list(tmp_path.iterdir())) == 1
+
+        # the cached result skips the database until the migrations change
+        alembic.stamp("base")
+        check_schema(test_app, alembic, mode="cached")
+        with pytest.raises(SchemaOutdated):
+            check_schema(test_app, alembic, mode="always")
+    finally:
+        alembic.stamp("heads")
+
+
+@pytest.mark.parametrize(
+    "argv, migrating",
+    [
+        (["flask", "db", "upgrade"], True),
+        (["flask", "--app", "main", "db", "upgrade"], True),
+        (["gunicorn"], False),
+        (["flask", "--app", "main", "docs", "purge"], False),
+    ],
+)
+def test_is_migrating(monkeypatch, argv, migrating):
+    monkeypatch.setattr(sys, "argv", argv)
+    assert is_migrating() is migrating
+
+
+def test_pool_reuses_connections(client, auth_headers):
+    client.get('/docs/', headers=auth_headers)
+    opened = pool_stats.opened
+    response = client.get('/docs/', headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert "db-connect" not in response.headers.get("Server-Timing", "")
+    assert pool_stats.opened == opened
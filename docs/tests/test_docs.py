@@ -1,7 +1,26 @@
+import base64
+import hashlib
+import io
 import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from http import HTTPStatus
 
 import pytest
+from flask import jsonify
+from PIL import Image
+from sqlalchemy import func, select, text
+
+from blueprints.docs import LOOKUP_MAX_IDS
+from extensions import db
+from models import Blob, Doc, ThumbnailJob, ThumbnailStatus
+from purge import purge, sweep_orphaned_files
+from storage import collect_garbage, get_blob_path
+from thumbnails import thumbnail_worker
+from upload_utils import TEMP_PREFIX
 
 
 def test_get_docs_list_unauthorized(client):
@@ -77,3 +96,376 @@ def test_sort_by_created_at_desc(client, doc_jpg, doc_txt, auth_headers):
     response = client.get(f"/docs/?order=-created_at", headers=auth_headers)
     assert response.status_code == HTTPStatus.OK
     assert response.json["results"] == [doc_txt.serialize, doc_jpg.serialize]
+
+
+@pytest.mark.parametrize("order", ["created_at", "-created_at", "name", "-name"])
+def test_cursor_pagination(client, doc_jpg, doc_txt, auth_headers, order):
+    response = client.get(f"/docs/?pagination=cursor&limit=1&order={order}", headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert "count" not in response.json
+    assert response.json["previous"] is None
+    first_page = response.json["results"]
+
+    response = client.get(response.json["next"], headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json["next"] is None
+    assert len(response.json["results"]) == 1
+    assert response.json["results"] != first_page
+
+    response = client.get(response.json["previous"], headers=auth_headers)
+    assert response.json["results"] == first_page
+
+
+def test_cursor_pagination_count(client, doc_jpg, doc_txt, auth_headers):
+    response = client.get("/docs/?pagination=cursor&count=exact", headers=auth_headers)
+    assert response.json["count"] == 2
+    response = client.get("/docs/?pagination=cursor&count=estimate", headers=auth_headers)
+    assert isinstance(response.json["count"], int)
+
+
+def test_cursor_pagination_invalid_cursor(client, auth_headers):
+    response = client.get("/docs/?pagination=cursor&cursor=invalid", headers=auth_headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize("value", [["a"], {"a": 1}, 1, True])
+@pytest.mark.parametrize("order", ["created_at", "name"])
+def test_cursor_pagination_cursor_value_type_mismatch(client, doc_txt, auth_headers, order, value):
+    cursor = base64.urlsafe_b64encode(json.dumps({"v": value, "id": str(uuid.uuid4())}).encode()).decode()
+    response = client.get(f"/docs/?pagination=cursor&order={order}&cursor={cursor}", headers=auth_headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_offset_pagination_without_count(client, doc_jpg, doc_txt, auth_headers):
+    response = client.get("/docs/?limit=1&count=none", headers=auth_headers)
+    assert "count" not in response.json
+    assert response.json["next"] is not None
+
+
+def test_list_matches_orm_serialization(client, doc_jpg, doc_txt, auth_headers):
+    response = client.get("/docs/?order=name", headers=auth_headers)
+    expected = jsonify({
+        "count": 2,
+        "next": None,
+        "previous": None,
+        "results": [doc_jpg.serialize, doc_txt.serialize],
+    })
+    assert response.get_data() == expected.get_data()
+
+
+def test_upload_doc_stores_hash_and_size(client, test_app, auth_headers):
+    content = b"streamed content"
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (io.BytesIO(content), "streamed.txt")}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    doc = Doc.query.get(json.loads(response.json["result"])["id"])
+    assert doc.content_hash == hashlib.sha256(content).hexdigest()
+    assert doc.size == len(content)
+    with open(doc.path, "rb") as f:
+        assert f.read() == content
+
+
+def test_upload_doc_too_large(client, test_app, auth_headers, monkeypatch):
+    monkeypatch.setitem(test_app.config, "UPLOAD_SIZE_LIMITS", {".txt": 10})
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (io.BytesIO(b"x" * 11), "large.txt")}
+    )
+    assert response.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    assert not any(name.startswith(".upload-") for name in os.listdir(test_app.config["UPLOAD_FOLDER"]))
+
+
+def test_upload_doc_not_allowed(client, auth_headers):
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (io.BytesIO(b"x"), "program.exe")}
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_upload_image_generates_thumbnail(client, test_app, auth_headers):
+    image = io.BytesIO()
+    Image.new("RGB", (1600, 1200)).save(image, "JPEG")
+    image.seek(0)
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (image, "large.jpg")}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    doc = Doc.query.get(json.loads(response.json["result"])["id"])
+    assert doc.thumbnail_status == ThumbnailStatus.PENDING
+    assert doc.thumbnail is None
+
+    assert thumbnail_worker.drain() == 1
+    db.session.refresh(doc)
+    assert doc.thumbnail_status == ThumbnailStatus.DONE
+    with Image.open(doc.thumbnail) as thumbnail:
+        assert max(thumbnail.size) == thumbnail_worker.size
+
+
+def test_upload_invalid_image_fails_thumbnail(client, test_app, auth_headers):
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (io.BytesIO(b"not an image"), "broken.png")}
+    )
+    doc = Doc.query.get(json.loads(response.json["result"])["id"])
+    thumbnail_worker.drain()
+    db.session.refresh(doc)
+    assert doc.thumbnail_status == ThumbnailStatus.FAILED
+    assert doc.thumbnail is None
+
+
+def test_upload_oversized_image_fails_thumbnail(client, test_app, auth_headers, monkeypatch):
+    image = io.BytesIO()
+    Image.new("RGB", (400, 300)).save(image, "PNG")
+    image.seek(0)
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (image, "huge.png")}
+    )
+    doc = Doc.query.get(json.loads(response.json["result"])["id"])
+    monkeypatch.setattr(thumbnail_worker, "max_pixels", 400 * 300 - 1)
+    thumbnail_worker.drain()
+    db.session.refresh(doc)
+    assert doc.thumbnail_status == ThumbnailStatus.FAILED
+    assert doc.thumbnail is None
+
+
+def test_slow_thumbnail_is_retried_without_holding_a_transaction(client, test_app, auth_headers, monkeypatch):
+    image = io.BytesIO()
+    Image.new("RGB", (400, 300)).save(image, "PNG")
+    doc = upload(client, auth_headers, image.getvalue(), "slow.png")
+    engine = db.engine
+    idle_in_transaction = []
+
+    def slow_thumbnail(*args):
+        with engine.connect() as connection:
+            query = text("SELECT count(*) FROM pg_stat_activity WHERE state LIKE 'idle in transaction%'")
+            idle_in_transaction.append(connection.execute(query).scalar())
+        time.sleep(0.5)
+
+    monkeypatch.setattr("thumbnails.make_thumbnail", slow_thumbnail)
+    monkeypatch.setattr(thumbnail_worker, "_get_executor", lambda: ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(thumbnail_worker, "timeout", 0.1)
+    assert thumbnail_worker.drain() == 1
+    assert idle_in_transaction == [0]
+
+    job = ThumbnailJob.query.filter_by(doc_id=doc.id).one()
+    assert job.status == ThumbnailStatus.PENDING
+    assert job.attempts == 1
+    assert "ThumbnailTimeout" in job.last_error
+    assert job.next_attempt_at > datetime.now()
+
+
+def upload(client, auth_headers, content: bytes, filename: str):
+    response = client.post(
+        "/docs/",
+        headers=auth_headers,
+        content_type="multipart/form-data",
+        data={"file": (io.BytesIO(content), filename)}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    return Doc.query.get(json.loads(response.json["result"])["id"])
+
+
+def test_upload_duplicate_shares_blob(client, test_app, auth_headers):
+    first = upload(client, auth_headers, b"same content", "first.pdf")
+    second = upload(client, auth_headers, b"same content", "second.pdf")
+    assert first.blob_hash == second.blob_hash
+    assert first.path == second.path
+    blob = Blob.query.get(first.blob_hash)
+    assert blob.ref_count == 2
+    assert not any(name.startswith(".upload-") for name in os.listdir(test_app.config["UPLOAD_FOLDER"]))
+
+
+def test_delete_releases_blob(client, test_app, auth_headers):
+    first = upload(client, auth_headers, b"released content", "first.pdf")
+    second = upload(client, auth_headers, b"released content", "second.pdf")
+    path = first.path
+
+    client.delete(f"/docs/{first.id}", headers=auth_headers)
+    collect_garbage(grace_period=0, batch_size=10)
+    assert Blob.query.get(first.blob_hash).ref_count == 1
+    assert os.path.exists(path)
+
+    client.delete(f"/docs/{second.id}", headers=auth_headers)
+    assert Blob.query.get(first.blob_hash).ref_count == 0
+    assert collect_garbage(grace_period=0, batch_size=10)["blobs"] == 1
+    assert Blob.query.get(second.content_hash) is None
+    assert not os.path.exists(path)
+
+
+def test_get_doc_content(client, test_app, auth_headers):
+    doc = upload(client, auth_headers, b"document content", "content.txt")
+    response = client.get(f"/docs/{doc.id}/content", headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.data == b"document content"
+    assert response.headers["ETag"] == f'"{doc.content_hash}"'
+    assert "Accept-Ranges" not in response.headers
+
+    headers = {**auth_headers, "If-None-Match": f'"{doc.content_hash}"'}
+    response = client.get(f"/docs/{doc.id}/content", headers=headers)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_get_doc_content_range(client, test_app, auth_headers):
+    doc = upload(client, auth_headers, b"0123456789", "video.mp4")
+    response = client.get(f"/docs/{doc.id}/content", headers={**auth_headers, "Range": "bytes=2-5"})
+    assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert response.data == b"2345"
+    assert response.headers["Content-Range"] == "bytes 2-5/10"
+
+
+def test_get_doc_content_x_accel_redirect(client, test_app, auth_headers, monkeypatch):
+    doc = upload(client, auth_headers, b"proxied content", "proxied.txt")
+    monkeypatch.setitem(test_app.config, "SENDFILE_MODE", "x-accel-redirect")
+    response = client.get(f"/docs/{doc.id}/content", headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"].endswith(doc.content_hash)
+
+
+def test_get_deleted_doc_content(client, test_app, auth_headers):
+    doc = upload(client, auth_headers, b"deleted content", "deleted.txt")
+    client.delete(f"/docs/{doc.id}", headers=auth_headers)
+    response = client.get(f"/docs/{doc.id}/content", headers=auth_headers)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_get_doc_thumbnail(client, test_app, auth_headers):
+    image = io.BytesIO()
+    Image.new("RGB", (400, 300)).save(image, "PNG")
+    doc = upload(client, auth_headers, image.getvalue(), "image.png")
+    response = client.get(f"/docs/{doc.id}/thumbnail", headers=auth_headers)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    thumbnail_worker.drain()
+    response = client.get(f"/docs/{doc.id}/thumbnail", headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "image/png"
+
+
+def test_lookup_docs(client, doc_jpg, doc_txt, auth_headers):
+    missing_id = uuid.uuid4()
+    response = client.post(
+        "/docs/lookup",
+        headers=auth_headers,
+        json={"ids": [str(missing_id), str(doc_txt.id), str(doc_jpg.id)]},
+    )
+    assert response.status_code == HTTPStatus.OK
+    # doc_txt belongs to another user
+    assert response.json["results"] == [
+        {"id": str(missing_id), "error": "not_found"},
+        {"id": str(doc_txt.id), "error": "not_found"},
+        doc_jpg.serialize,
+    ]
+
+
+def test_lookup_deleted_doc(client, doc_jpg, auth_headers):
+    doc_jpg.deleted = True
+    response = client.post("/docs/lookup", headers=auth_headers, json={"ids": [str(doc_jpg.id)]})
+    assert response.json["results"] == [{"id": str(doc_jpg.id), "error": "not_found"}]
+
+
+def test_lookup_too_many_ids(client, auth_headers):
+    response = client.post(
+        "/docs/lookup",
+        headers=auth_headers,
+        json={"ids": [str(uuid.uuid4()) for _ in range(LOOKUP_MAX_IDS + 1)]},
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_purge_deleted_docs(client, test_app, auth_headers):
+    kept = upload(client, auth_headers, b"kept content", "kept.txt")
+    purged = upload(client, auth_headers, b"purged content", "purged.txt")
+    purged_id, path = purged.id, purged.path
+    client.delete(f"/docs/{kept.id}", headers=auth_headers)
+    client.delete(f"/docs/{purged.id}", headers=auth_headers)
+    purged.deleted_at -= timedelta(days=31)
+    Blob.query.get(purged.blob_hash).unreferenced_at -= timedelta(days=2)
+    db.session.commit()
+
+    stats = purge(retention=30 * 24 * 3_600, grace_period=24 * 3_600, batch_size=1)
+    assert stats["docs"]["docs"] == 1
+    assert stats["blobs"]["blobs"] == 1
+    assert Doc.query.get(purged_id) is None
+    assert Doc.query.get(kept.id) is not None
+    assert not os.path.exists(path)
+
+
+def test_purge_keeps_reuploaded_blob(client, test_app, auth_headers):
+    deleted = upload(client, auth_headers, b"reuploaded content", "deleted.txt")
+    client.delete(f"/docs/{deleted.id}", headers=auth_headers)
+    assert collect_garbage(grace_period=0, batch_size=10)["blobs"] == 1
+    db.session.refresh(deleted)
+    assert deleted.blob_hash is None
+
+    live = upload(client, auth_headers, b"reuploaded content", "live.txt")
+    assert live.path == deleted.path
+    deleted.deleted_at -= timedelta(days=31)
+    db.session.commit()
+
+    stats = purge(retention=30 * 24 * 3_600, grace_period=24 * 3_600, batch_size=10)
+    assert stats["docs"]["docs"] == 1
+    assert stats["docs"]["files"] == 0
+    assert os.path.exists(live.path)
+
+
+def test_purge_legacy_doc_files(test_app, user_id):
+    path = os.path.join(test_app.config["UPLOAD_FOLDER"], "legacy.txt")
+    with open(path, "wb") as f:
+        f.write(b"legacy")
+    doc = Doc(
+        name="legacy", extension=".txt", path=path, user_id=user_id,
+        deleted=True, deleted_at=datetime.now() - timedelta(days=31),
+    )
+    db.session.add(doc)
+    db.session.commit()
+
+    stats = purge(retention=30 * 24 * 3_600, grace_period=24 * 3_600, batch_size=10)
+    assert stats["docs"]["files"] == 1
+    assert not os.path.exists(path)
+
+
+def test_purge_orphaned_files(test_app):
+    path = os.path.join(test_app.config["UPLOAD_FOLDER"], TEMP_PREFIX + "orphan")
+    with open(path, "wb") as f:
+        f.write(b"orphan")
+    os.utime(path, (0, 0))
+
+    stats = purge(retention=0, grace_period=3_600, batch_size=10)
+    assert stats["orphans"]["files"] == 1
+    assert not os.path.exists(path)
+
+
+def test_sweep_keeps_blob_file_of_uncommitted_upload(test_app):
+    content_hash = hashlib.sha256(b"uncommitted upload").hexdigest()
+    path = get_blob_path(content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"uncommitted upload")
+    os.utime(path, (0, 0))
+
+    # an upload reusing the file holds the lock until its blob row is committed
+    with db.engine.connect() as connection, connection.begin():
+        connection.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(content_hash, 0))))
+        assert sweep_orphaned_files(grace_period=3_600, batch_size=10)["files"] == 0
+        assert os.path.exists(path)
+
+    assert sweep_orphaned_files(grace_period=3_600, batch_size=10)["files"] == 1
+    assert not os.path.exists(path)
@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import Doc
+
+SEED_DOCS = 20_000
+SEED_USERS = 200
+EXTENSIONS = [".jpg", ".png", ".pdf", ".txt"]
+
+HOT_PATHS = [
+    "/docs/?order=created_at",
+    "/docs/?order=-created_at&offset=50",
+    "/docs/?order=name",
+    "/docs/?order=-name&extension=.pdf",
+    "/docs/?order=created_at&extension=.jpg",
+    "/docs/?order=-created_at&user_id={user_id}",
+    "/docs/?order=name&user_id={user_id}",
+    "/docs/?pagination=cursor&order=-created_at",
+    "/docs/?pagination=cursor&order=name&user_id={user_id}",
+]
+
+
+@pytest.fixture
+def seeded_docs(test_app, user_id):
+    users = [user_id] + [uuid.uuid4() for _ in range(SEED_USERS - 1)]
+    started = datetime.now() - timedelta(days=365)
+    db.session.execute(
+        Doc.__table__.insert(),
+        [
+            {
+                "name": f"doc_{i:05}",
+                "extension": EXTENSIONS[i % len(EXTENSIONS)],
+                "path": f"doc_{i:05}",
+                "user_id": users[i % SEED_USERS],
+                # not a divisor of SEED_USERS, so every user keeps live docs
+                "deleted": i % 7 == 0,
+                "created_at": started + timedelta(minutes=i),
+            }
+            for i in range(SEED_DOCS)
+        ],
+    )
+    db.session.commit()
+    db.session.execute("ANALYZE docs.docs")
+    return users
+
+
+def get_node_types(plan: dict):
+    yield plan["Node Type"]
+    for child in plan.get("Plans", []):
+        yield from get_node_types(child)
+
+
+def capture_page_queries(client, url: str, headers: dict) -> tuple:
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # count queries are opt-in, only the page queries are on the hot path
+        if "LIMIT" in statement and "count(" not in statement:
+            queries.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    return response, queries
+
+
+@pytest.mark.parametrize("path", HOT_PATHS)
+def test_list_queries_use_indexes(client, seeded_docs, auth_headers, path):
+    response, queries = capture_page_queries(client, path.format(user_id=seeded_docs[0]), auth_headers)
+    assert queries
+    # the second page exercises the offset or the cursor condition
+    _, next_queries = capture_page_queries(client, response.json["next"], auth_headers)
+    queries += next_queries
+
+    for statement, parameters in queries:
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        node_types = list(get_node_types(plan[0]["Plan"]))
+        assert "Seq Scan" not in node_types, f"{path}: {node_types}"
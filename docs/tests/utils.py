@@ -6,16 +6,18 @@ import jwt
 from app import get_config
 
 
-def generate_token(pk: uuid.UUID, expires: int = 24 * 3_600):
+def generate_token(pk: uuid.UUID, expires: int = 24 * 3_600, headers: dict = None, jti: str = None):
     dt = datetime.now() + timedelta(seconds=expires)
     token = jwt.encode(
         {
             "id": str(pk),
             "action": "login",
             "exp": int(dt.strftime("%s")),
+            "jti": jti or uuid.uuid4().hex,
         },
         open(get_config()["JWT_PRIVATE_KEY_PATH"]).read(),
         algorithm="RS256",
+        headers=headers,
     )
     return token
 
@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+from PIL import Image, UnidentifiedImageError
+
+from extensions import db
+from models import Blob, Doc, ThumbnailJob, ThumbnailStatus
+from storage import get_thumbnail_path
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class ThumbnailTimeout(Exception):
+    pass
+
+
+def make_thumbnail(main_path: str, thumbnail_path: str, size: int, max_pixels: int):
+    with Image.open(main_path) as image:
+        # only JPEGs can be decoded at a reduced DCT scale, every other format is decoded in full
+        image.draft(image.mode, (size, size))
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageTooLarge(f"{width}x{height} exceeds {max_pixels} pixels")
+        image.thumbnail((size, size), reducing_gap=2.0)
+        image.save(thumbnail_path)
+
+
+class ThumbnailWorker:
+    def __init__(self):
+        self.app = None
+        self._wake_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._executor = None
+        self._pid = None
+
+    def init_app(self, app, autostart: bool = True):
+        self.app = app
+        self.size = int(app.config.get("THUMBNAIL_SIZE", 100))
+        # bounds the memory of a full decode, roughly 4 bytes per pixel
+        self.max_pixels = int(app.config.get("THUMBNAIL_MAX_PIXELS", 40_000_000))
+        self.batch_size = int(app.config.get("THUMBNAIL_BATCH_SIZE", 20))
+        self.max_attempts = int(app.config.get("THUMBNAIL_MAX_ATTEMPTS", 3))
+        self.retry_backoff = int(app.config.get("THUMBNAIL_RETRY_BACKOFF", 30))
+        self.poll_interval = int(app.config.get("THUMBNAIL_POLL_INTERVAL", 10))
+        # jobs of a batch not done within the timeout are retried, jobs claimed by a crashed worker once the claim ends
+        self.timeout = int(app.config.get("THUMBNAIL_TIMEOUT", 60))
+        self.claim_timeout = int(app.config.get("THUMBNAIL_CLAIM_TIMEOUT", 300))
+        self.executor_class = EXECUTORS[app.config.get("THUMBNAIL_EXECUTOR", "process")]
+        self.max_workers = int(app.config.get("THUMBNAIL_MAX_WORKERS", os.cpu_count() or 1))
+        self.autostart = autostart
+        app.extensions["thumbnail_worker"] = self
+
+    def _get_executor(self):
+        # neither the pool nor the worker thread survive a fork, create them lazily per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = self.executor_class(max_workers=self.max_workers)
+                    self._thread = None
+                    self._pid = os.getpid()
+        return self._executor
+
+    def start(self):
+        self._get_executor()
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.run, name="thumbnails", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        if not self.autostart:
+            return
+        self.start()
+        self._wake_event.set()
+
+    def run(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    self.drain()
+                except Exception:
+                    logger.exception("Failed to process thumbnail jobs")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+
+    def drain(self) -> int:
+        processed = 0
+        while True:
+            batch_size = self.process_batch()
+            processed += batch_size
+            if batch_size < self.batch_size:
+                return processed
+
+    def process_batch(self) -> int:
+        tasks = self._claim()
+        if not tasks:
+            return 0
+
+        # no transaction or row lock is held while the images are decoded
+        executor = self._get_executor()
+        futures = [
+            (job_id, thumbnail_path, executor.submit(make_thumbnail, path, thumbnail_path, self.size, self.max_pixels))
+            for job_id, path, thumbnail_path in tasks
+        ]
+        results = {}
+        deadline = time.monotonic() + self.timeout
+        for job_id, thumbnail_path, future in futures:
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                future.cancel()
+                results[job_id] = (thumbnail_path, ThumbnailTimeout(f"not done after {self.timeout}s"))
+            except Exception as e:
+                results[job_id] = (thumbnail_path, e)
+            else:
+                results[job_id] = (thumbnail_path, None)
+
+        self._record(results)
+        return len(tasks)
+
+    def _claim(self) -> list:
+        # pushing next_attempt_at past the claim timeout hides the jobs from other workers once committed
+        now = datetime.now()
+        jobs = (
+            ThumbnailJob.query.with_for_update(skip_locked=True)
+            .filter(ThumbnailJob.status == ThumbnailStatus.PENDING, ThumbnailJob.next_attempt_at <= now)
+            .order_by(ThumbnailJob.next_attempt_at, ThumbnailJob.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        tasks = []
+        if jobs:
+            docs = {doc.id: doc for doc in Doc.query.filter(Doc.id.in_([job.doc_id for job in jobs]))}
+            blob_hashes = {doc.blob_hash for doc in docs.values() if doc.blob_hash}
+            blobs = {blob.content_hash: blob for blob in Blob.query.filter(Blob.content_hash.in_(blob_hashes))}
+            for job in jobs:
+                job.next_attempt_at = now + timedelta(seconds=self.claim_timeout)
+                doc = docs[job.doc_id]
+                if doc.blob_hash:
+                    thumbnail_path = get_thumbnail_path(blobs[doc.blob_hash], doc.extension)
+                else:
+                    upload_folder = self.app.config["UPLOAD_FOLDER"]
+                    thumbnail_path = os.path.join(upload_folder, str(doc.id) + "_thumb" + doc.extension)
+                tasks.append((job.id, doc.path, thumbnail_path))
+        db.session.commit()
+        return tasks
+
+    def _record(self, results: dict):
+        # jobs whose doc was deleted while the image was decoded are gone
+        jobs = ThumbnailJob.query.filter(ThumbnailJob.id.in_(list(results))).all()
+        docs = {doc.id: doc for doc in Doc.query.filter(Doc.id.in_([job.doc_id for job in jobs]))}
+        for job in jobs:
+            doc = docs[job.doc_id]
+            thumbnail_path, error = results[job.id]
+            job.attempts += 1
+            if error is None:
+                job.status = ThumbnailStatus.DONE
+                job.last_error = None
+                self._set_thumbnail(doc, ThumbnailStatus.DONE, thumbnail_path)
+            elif isinstance(error, (UnidentifiedImageError, Image.DecompressionBombError, ImageTooLarge)):
+                self._fail(job, doc, error)
+            else:
+                self._schedule_retry(job, doc, error)
+        db.session.commit()
+
+    def _set_thumbnail(self, doc, status: str, thumbnail_path: str = None):
+        doc.thumbnail_status = status
+        doc.thumbnail = thumbnail_path
+        if doc.blob_hash:
+            values = {"thumbnail": thumbnail_path, "thumbnail_status": status}
+            Blob.query.filter_by(content_hash=doc.blob_hash).update(values, synchronize_session=False)
+            Doc.query.filter_by(blob_hash=doc.blob_hash).update(values, synchronize_session=False)
+
+    def _fail(self, job, doc, error: Exception):
+        job.status = ThumbnailStatus.FAILED
+        self._set_thumbnail(doc, ThumbnailStatus.FAILED)
+        job.last_error = repr(error)
+        logger.error("Giving up on thumbnail for doc %s after %s attempts: %r", doc.id, job.attempts, error)
+
+    def _schedule_retry(self, job, doc, error: Exception):
+        if job.attempts >= self.max_attempts:
+            self._fail(job, doc, error)
+            return
+        job.last_error = repr(error)
+        job.next_attempt_at = datetime.now() + timedelta(seconds=self.retry_backoff * 2 ** (job.attempts - 1))
+
+
+thumbnail_worker = ThumbnailWorker()
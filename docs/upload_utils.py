@@ -0,0 +1,63 @@
+import hashlib
+import os
+import tempfile
+from http import HTTPStatus
+
+from flask import Request, current_app as app
+from werkzeug.exceptions import HTTPException
+
+HASH_ALGORITHM = "sha256"
+TEMP_PREFIX = ".upload-"
+
+
+class UploadRejected(HTTPException):
+    def __init__(self, status: int, message: str):
+        super().__init__(description=message)
+        self.code = status
+
+
+class HashingFile:
+    # the temporary file lives in the upload folder, so saving it is a rename instead of a copy
+    def __init__(self, directory: str, max_size: int):
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix=TEMP_PREFIX, delete=False)
+        self.hash = hashlib.new(HASH_ALGORITHM)
+        self.size = 0
+        self.max_size = max_size
+        self.saved = False
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    @property
+    def content_hash(self) -> str:
+        return self.hash.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_size:
+            # stop reading the request body as soon as the limit is crossed
+            self.close()
+            raise UploadRejected(status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE, message="The file is too large")
+        self.hash.update(data)
+        return self.file.write(data)
+
+    def save(self, path: str):
+        self.file.close()
+        os.replace(self.file.name, path)
+        self.saved = True
+
+    def close(self):
+        self.file.close()
+        if not self.saved and os.path.exists(self.file.name):
+            os.unlink(self.file.name)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = os.path.splitext(filename or "")[1].lower()
+        max_size = app.config["UPLOAD_SIZE_LIMITS"].get(extension)
+        if max_size is None:
+            raise UploadRejected(status=HTTPStatus.BAD_REQUEST, message="The file type is not allowed")
+        if content_length and content_length > max_size:
+            raise UploadRejected(status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE, message="The file is too large")
+        return HashingFile(directory=app.config["UPLOAD_FOLDER"], max_size=max_size)